@@ -0,0 +1,40 @@
+"""
+Set-based alert evaluation.
+
+Given a batch of new prices, every alert whose target is met is found and
+claimed in one statement. The (catalogId, targetPrice) index turns each
+product's lookup into a range scan over just the alerts that fire, so the
+cost tracks triggered alerts rather than all alerts.
+"""
+from collections import namedtuple
+
+from db_utils import values_list
+
+TriggeredAlert = namedtuple(
+    'TriggeredAlert',
+    ['id', 'email', 'userId', 'productId', 'catalogId', 'targetPrice', 'price', 'name', 'url']
+)
+
+
+async def claim_triggered_alerts(db, prices):
+    """Delete and return alerts triggered by a list of (catalog_id, price), ordered by (catalogId, targetPrice)"""
+    if not prices:
+        return []
+
+    values, params = values_list(prices, ('', '::double precision'))
+    rows = await db.query_raw(
+        f'''
+        WITH fired AS (
+            DELETE FROM alerts AS a
+            USING (VALUES {values}) AS v(id, price), catalog_products AS c
+            WHERE a."catalogId" = v.id
+              AND a."targetPrice" >= v.price
+              AND c.id = v.id
+            RETURNING a.id, a.email, a."userId", a."productId", a."catalogId", a."targetPrice",
+                      v.price, c.name, c.url
+        )
+        SELECT * FROM fired ORDER BY "catalogId", "targetPrice"
+        ''',
+        *params
+    )
+    return [TriggeredAlert(**row) for row in rows]
@@ -1,19 +1,57 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from jose import JWTError, jwt
+import asyncio
 import bcrypt
 from fastapi import HTTPException, status
 import os
+import threading
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# bcrypt releases the GIL, so a small thread pool hashes in parallel off the event loop
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+BCRYPT_POOL_SIZE = int(os.getenv("BCRYPT_POOL_SIZE", 4))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", 64))
+
+hash_pool = ThreadPoolExecutor(max_workers=BCRYPT_POOL_SIZE, thread_name_prefix="bcrypt")
+hash_pending = 0
+hash_pending_lock = threading.Lock()
+
 def verify_password(plain_password, hashed_password):
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 def get_password_hash(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+async def run_in_hash_pool(func, *args):
+    """Run a bcrypt call on the hashing pool, shedding load with 429 once the queue is full"""
+    global hash_pending
+    with hash_pending_lock:
+        if hash_pending >= BCRYPT_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many authentication requests, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_pool, func, *args)
+    finally:
+        with hash_pending_lock:
+            hash_pending -= 1
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await run_in_hash_pool(get_password_hash, password)
+
+def hash_pool_stats():
+    return {"workers": BCRYPT_POOL_SIZE, "pending": hash_pending, "max_pending": BCRYPT_MAX_PENDING}
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
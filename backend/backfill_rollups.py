@@ -0,0 +1,36 @@
+"""
+Build hourly, daily and weekly price rollups from existing history.
+
+Run once after `python -m prisma db push` has created price_rollups, or any
+time to rebuild them:
+
+    python backfill_rollups.py [--resolution day]
+"""
+import argparse
+import asyncio
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from prisma import Prisma
+
+from rollups import ROLLUP_RESOLUTIONS, backfill_rollups
+
+
+async def backfill(resolutions):
+    db = Prisma()
+    await db.connect()
+    try:
+        for resolution in resolutions:
+            count = await backfill_rollups(db, resolution)
+            print(f"Backfilled {count} {resolution} rollups")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build price rollups from price history")
+    parser.add_argument("--resolution", choices=ROLLUP_RESOLUTIONS, help="only rebuild one resolution")
+    args = parser.parse_args()
+    asyncio.run(backfill([args.resolution] if args.resolution else ROLLUP_RESOLUTIONS))
@@ -0,0 +1,112 @@
+"""
+Login-storm benchmark: latency of a non-auth endpoint while logins hash passwords.
+
+Runs an in-process ASGI app with two login routes, one calling bcrypt inline
+(the old behaviour) and one going through the bounded hashing pool. It then
+fires a burst of concurrent logins while a probe hits a cheap endpoint at a
+fixed rate, and reports the probe's p50/p99 for each mode. Probe latency is
+measured from each probe's intended send time, so a probe that couldn't even
+be sent while bcrypt blocked the event loop still counts the stall (no
+coordinated omission).
+
+    python bench_login_storm.py --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from auth import BCRYPT_ROUNDS, get_password_hash, verify_password, verify_password_async
+
+PASSWORD = "correct horse battery staple"
+
+app = FastAPI()
+stored_hash = get_password_hash(PASSWORD)
+
+
+@app.post("/login/inline")
+async def login_inline():
+    if not verify_password(PASSWORD, stored_hash):
+        raise HTTPException(status_code=401)
+    return {"ok": True}
+
+
+@app.post("/login/pooled")
+async def login_pooled():
+    if not await verify_password_async(PASSWORD, stored_hash):
+        raise HTTPException(status_code=401)
+    return {"ok": True}
+
+
+@app.get("/ping")
+async def ping():
+    return {"ok": True}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def storm(client, mode, logins, concurrency, probe_interval):
+    limit = asyncio.Semaphore(concurrency)
+    statuses = []
+
+    async def login():
+        async with limit:
+            response = await client.post(f"/login/{mode}")
+            statuses.append(response.status_code)
+
+    async def ping(intended):
+        await client.get("/ping")
+        return (time.perf_counter() - intended) * 1000
+
+    async def probe(finished):
+        # Overdue probes are sent at once after a stall, each timed from its slot in the schedule
+        pings = []
+        origin = time.perf_counter()
+        for slot in itertools.count():
+            intended = origin + slot * probe_interval
+            if finished.done() and intended > finished.result():
+                break
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            pings.append(asyncio.create_task(ping(intended)))
+        return await asyncio.gather(*pings)
+
+    finished = asyncio.get_running_loop().create_future()
+    prober = asyncio.create_task(probe(finished))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    finished.set_result(time.perf_counter())
+    latencies = await prober
+
+    shed = statuses.count(429)
+    print(
+        f"{mode:7}  logins={logins} in {elapsed:.2f}s ({shed} shed with 429)  "
+        f"ping p50={statistics.median(latencies):.1f}ms p99={percentile(latencies, 99):.1f}ms "
+        f"max={max(latencies):.1f}ms over {len(latencies)} probes"
+    )
+
+
+async def main(args):
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode in args.modes:
+            await storm(client, mode, args.logins, args.concurrency, args.probe_interval_ms / 1000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Non-auth endpoint latency during a login storm")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probe-interval-ms", type=float, default=5, help="fixed probe schedule")
+    parser.add_argument("--modes", nargs="+", default=["inline", "pooled"], choices=["inline", "pooled"])
+    asyncio.run(main(parser.parse_args()))
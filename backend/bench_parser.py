@@ -0,0 +1,178 @@
+"""
+Offline parser benchmark over the checked-in Amazon fixture corpus.
+
+Drives AmazonSpider.parse and AmazonPipeline.process_item over every page in
+fixtures/amazon/, checks the items against expected.json, and reports
+throughput (pages/sec), Python heap use per page and per-field accuracy.
+Heap use comes from tracemalloc: the peak traced memory during each parse
+(transient allocations included) and the Python blocks still allocated
+after it. tracemalloc only sees Python's allocator, so memory lxml/libxml2
+allocate in C (the parsed tree itself) is not measured.
+
+Results are compared with fixtures/amazon/baseline.json and the script
+exits with status 1 on a regression, so it can gate CI without network
+access:
+
+    python bench_parser.py                    # compare against the baseline
+    python bench_parser.py --update-baseline  # record a new baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from scrapy.http import HtmlResponse, Request
+
+from scrapy_spider.amazon_spider import AmazonSpider
+from scrapy_spider.pipelines import AmazonPipeline
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'amazon')
+FIELDS = ('name', 'price', 'image')
+
+
+def load_corpus():
+    with open(os.path.join(FIXTURES_DIR, 'expected.json'), encoding='utf-8') as f:
+        expected = json.load(f)
+
+    corpus = []
+    for name, item in sorted(expected.items()):
+        with open(os.path.join(FIXTURES_DIR, f'{name}.html'), 'rb') as f:
+            body = f.read()
+        corpus.append((name, body, item))
+    return corpus
+
+
+def make_response(url, body):
+    request = Request(url=url, meta={'source_url': url, 'known': {}})
+    return HtmlResponse(url=url, body=body, encoding='utf-8', request=request)
+
+
+async def scrape_page(spider, pipeline, url, body):
+    """One page through parse and the item pipeline, like a live crawl"""
+    items = []
+    async for item in spider.parse(make_response(url, body)):
+        items.append(pipeline.process_item(item, spider))
+    return items[0] if items else None
+
+
+async def check_accuracy(spider, pipeline, corpus):
+    mismatches = []
+    correct = {field: 0 for field in FIELDS}
+    for name, body, expected in corpus:
+        item = await scrape_page(spider, pipeline, expected['url'], body) or {}
+        for field in FIELDS:
+            if item.get(field) == expected[field]:
+                correct[field] += 1
+            else:
+                mismatches.append(f"{name}.{field}: got {item.get(field)!r}, expected {expected[field]!r}")
+    accuracy = {field: correct[field] / len(corpus) for field in FIELDS}
+    return accuracy, mismatches
+
+
+async def measure_throughput(spider, pipeline, corpus, rounds):
+    pages = [(expected['url'], body) for _, body, expected in corpus]
+    for url, body in pages:
+        await scrape_page(spider, pipeline, url, body)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for url, body in pages:
+            await scrape_page(spider, pipeline, url, body)
+    elapsed = time.perf_counter() - started
+    return rounds * len(pages) / elapsed
+
+
+async def measure_heap(spider, pipeline, corpus):
+    """Retained Python blocks and peak traced Python memory per page, averaged over the corpus"""
+    retained = 0
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _, body, expected in corpus:
+            tracemalloc.clear_traces()
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            await scrape_page(spider, pipeline, expected['url'], body)
+            after = tracemalloc.take_snapshot()
+            retained += sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+            peak += tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return retained / len(corpus), peak / len(corpus) / 1024
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against the baseline; throughput and memory get `tolerance` slack"""
+    problems = []
+    for field in FIELDS:
+        if results['accuracy'][field] < baseline['accuracy'][field]:
+            problems.append(f"{field} accuracy dropped to {results['accuracy'][field]:.0%} from {baseline['accuracy'][field]:.0%}")
+    if results['pages_per_sec'] < baseline['pages_per_sec'] * (1 - tolerance):
+        problems.append(f"throughput {results['pages_per_sec']:.1f} pages/s is below baseline {baseline['pages_per_sec']:.1f}")
+    if results['peak_kib_per_page'] > baseline['peak_kib_per_page'] * (1 + tolerance):
+        problems.append(f"peak Python memory {results['peak_kib_per_page']:.0f} KiB/page is above baseline {baseline['peak_kib_per_page']:.0f}")
+    if results['retained_blocks_per_page'] > baseline['retained_blocks_per_page'] * (1 + tolerance):
+        problems.append(
+            f"{results['retained_blocks_per_page']:.0f} retained Python blocks/page is above "
+            f"baseline {baseline['retained_blocks_per_page']:.0f}"
+        )
+    return problems
+
+
+async def main(args):
+    corpus = load_corpus()
+    spider = AmazonSpider(urls=[])
+    pipeline = AmazonPipeline()
+
+    accuracy, mismatches = await check_accuracy(spider, pipeline, corpus)
+    pages_per_sec = await measure_throughput(spider, pipeline, corpus, args.rounds)
+    retained, peak_kib = await measure_heap(spider, pipeline, corpus)
+
+    results = {
+        'pages': len(corpus),
+        'pages_per_sec': round(pages_per_sec, 1),
+        'retained_blocks_per_page': round(retained),
+        'peak_kib_per_page': round(peak_kib, 1),
+        'accuracy': accuracy
+    }
+
+    print(f"{len(corpus)} fixture pages, {args.rounds} rounds")
+    print(f"throughput:  {results['pages_per_sec']} pages/s")
+    print(f"python heap: peak {results['peak_kib_per_page']} KiB/page, "
+          f"{results['retained_blocks_per_page']} retained blocks/page (lxml's C memory not measured)")
+    print("accuracy:    " + ", ".join(f"{field} {accuracy[field]:.0%}" for field in FIELDS))
+    for mismatch in mismatches:
+        print(f"  mismatch {mismatch}")
+
+    baseline_path = os.path.join(FIXTURES_DIR, 'baseline.json')
+    if args.update_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {baseline_path}")
+        return
+
+    if not os.path.exists(baseline_path):
+        print("No baseline yet - run with --update-baseline")
+        return
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    problems = compare(results, baseline, args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"No regressions against baseline ({baseline['pages_per_sec']} pages/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parser throughput, Python heap and accuracy benchmark")
+    parser.add_argument("--rounds", type=int, default=20, help="passes over the corpus for throughput")
+    parser.add_argument("--tolerance", type=float, default=float(os.getenv('BENCH_TOLERANCE', 0.3)),
+                        help="allowed relative throughput/memory regression")
+    parser.add_argument("--update-baseline", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,39 @@
+"""
+Canonical product identity for the shared catalog.
+
+Every Amazon product URL is reduced to its marketplace (amazon.in, amazon.com,
+...) and ASIN, so all users tracking the same item share one CatalogProduct.
+"""
+import re
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+ASIN_PATTERN = re.compile(
+    r'/(?:dp|gp/product|gp/aw/d|exec/obidos/asin|o/asin|product)/([A-Z0-9]{10})(?=[/?#]|$)',
+    re.IGNORECASE
+)
+
+
+def canonicalize_url(url: str) -> Optional[Tuple[str, str, str]]:
+    """Return (marketplace, asin, canonical_url) for an Amazon product URL, or None"""
+    if not url:
+        return None
+
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    index = host.find('amazon.')
+    if index == -1 or (index > 0 and host[index - 1] != '.'):
+        return None
+    marketplace = host[index:]
+
+    match = ASIN_PATTERN.search(parsed.path)
+    if not match:
+        return None
+    asin = match.group(1).upper()
+
+    return marketplace, asin, f"https://www.{marketplace}/dp/{asin}"
+
+
+def catalog_where(marketplace: str, asin: str) -> dict:
+    """Prisma unique filter for a catalog entry"""
+    return {"marketplace_asin": {"marketplace": marketplace, "asin": asin}}
@@ -0,0 +1,124 @@
+"""
+Adaptive per-product check frequency.
+
+With PRICE_CHECK_SCHEDULE=adaptive every catalog product carries its own
+nextCheckAt, and the scheduler picks due products from the catalog_products
+(nextCheckAt) index every CHECK_TICK_SECONDS instead of sweeping everything
+hourly. After each successful scrape the next interval is recomputed from:
+
+- volatility: price changes per day over the last CHECK_VOLATILITY_DAYS
+- alert proximity: how close the price is to the nearest untriggered target
+- popularity: how many users subscribe to the product
+
+A stable, single-subscriber product without alerts drifts towards
+CHECK_MAX_INTERVAL; a volatile, popular product or one about to hit an
+alert is pulled towards CHECK_MIN_INTERVAL.
+"""
+import math
+import os
+
+from db_utils import UTC_NOW, values_list
+
+ADAPTIVE_SCHEDULE = os.getenv('PRICE_CHECK_SCHEDULE', 'fixed') == 'adaptive'
+CHECK_TICK_SECONDS = float(os.getenv('CHECK_TICK_SECONDS', 300))
+CHECK_MAX_PER_TICK = int(os.getenv('CHECK_MAX_PER_TICK', 0)) or None
+CHECK_BASE_INTERVAL = float(os.getenv('CHECK_BASE_INTERVAL_SECONDS', 3600))
+CHECK_MIN_INTERVAL = float(os.getenv('CHECK_MIN_INTERVAL_SECONDS', 900))
+CHECK_MAX_INTERVAL = float(os.getenv('CHECK_MAX_INTERVAL_SECONDS', 86400))
+CHECK_VOLATILITY_DAYS = float(os.getenv('CHECK_VOLATILITY_DAYS', 7))
+
+# How strongly each signal shortens the interval relative to the base
+STABLE_FACTOR = float(os.getenv('CHECK_STABLE_FACTOR', 0.25))
+VOLATILITY_WEIGHT = float(os.getenv('CHECK_VOLATILITY_WEIGHT', 1.0))
+PROXIMITY_WEIGHT = float(os.getenv('CHECK_PROXIMITY_WEIGHT', 3.0))
+PROXIMITY_RANGE = float(os.getenv('CHECK_PROXIMITY_RANGE', 0.10))
+POPULARITY_WEIGHT = float(os.getenv('CHECK_POPULARITY_WEIGHT', 0.5))
+
+
+def check_interval(changes_per_day, alert_gap, subscribers):
+    """Seconds until the next check; alert_gap is the relative distance to the nearest target (0.05 = 5%) or None"""
+    rate = STABLE_FACTOR + VOLATILITY_WEIGHT * changes_per_day
+
+    if alert_gap is not None and alert_gap < PROXIMITY_RANGE:
+        rate *= 1 + PROXIMITY_WEIGHT * (1 - max(alert_gap, 0) / PROXIMITY_RANGE)
+
+    if subscribers > 1:
+        rate *= 1 + POPULARITY_WEIGHT * math.log2(subscribers)
+
+    return min(CHECK_MAX_INTERVAL, max(CHECK_MIN_INTERVAL, CHECK_BASE_INTERVAL / rate))
+
+
+async def schedule_next_checks(db, catalog_ids):
+    """Recompute nextCheckAt for freshly checked catalog products in one round-trip each way"""
+    if not catalog_ids:
+        return
+
+    values, params = values_list([(catalog_id,) for catalog_id in catalog_ids], ('',))
+    stats = await db.query_raw(
+        f'''
+        WITH v(id) AS (VALUES {values})
+        SELECT c.id,
+            (
+                SELECT COUNT(*) FROM (
+                    SELECT h.price, LAG(h.price) OVER (ORDER BY h.timestamp) AS previous
+                    FROM price_history AS h
+                    WHERE h."catalogId" = c.id
+                      AND h.timestamp >= {UTC_NOW} - make_interval(days => ${len(params) + 1}::int)
+                ) AS changes
+                WHERE previous IS NOT NULL AND price <> previous
+            ) AS changes,
+            (
+                SELECT MIN((c."currentPrice" - a."targetPrice") / NULLIF(c."currentPrice", 0))
+                FROM alerts AS a
+                WHERE a."catalogId" = c.id AND a."targetPrice" < c."currentPrice"
+            ) AS "alertGap",
+            (SELECT COUNT(*) FROM products AS p WHERE p."catalogId" = c.id) AS subscribers
+        FROM catalog_products AS c
+        JOIN v ON v.id = c.id
+        ''',
+        *params, math.ceil(CHECK_VOLATILITY_DAYS)
+    )
+
+    intervals = [
+        (
+            row['id'],
+            check_interval(
+                int(row['changes']) / CHECK_VOLATILITY_DAYS,
+                float(row['alertGap']) if row['alertGap'] is not None else None,
+                int(row['subscribers'])
+            )
+        )
+        for row in stats
+    ]
+    values, params = values_list(intervals, ('', '::double precision'))
+    await db.execute_raw(
+        f'''
+        UPDATE catalog_products AS c
+        SET "nextCheckAt" = {UTC_NOW} + make_interval(secs => v.secs)
+        FROM (VALUES {values}) AS v(id, secs)
+        WHERE c.id = v.id
+        ''',
+        *params
+    )
+
+
+async def claim_due_products(db, limit=None):
+    """Claim the ids of due subscribed catalog products"""
+    # Claimed products are pushed back by the floor so a failed scrape isn't retried every tick
+    rows = await db.query_raw(
+        f'''
+        UPDATE catalog_products
+        SET "nextCheckAt" = {UTC_NOW} + make_interval(secs => $2::double precision)
+        WHERE id IN (
+            SELECT c.id FROM catalog_products AS c
+            WHERE c."nextCheckAt" <= {UTC_NOW}
+              AND EXISTS (SELECT 1 FROM products AS p WHERE p."catalogId" = c.id)
+            ORDER BY c."nextCheckAt"
+            LIMIT $1::int
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id
+        ''',
+        limit, CHECK_MIN_INTERVAL
+    )
+    return [row['id'] for row in rows]
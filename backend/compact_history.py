@@ -0,0 +1,82 @@
+"""
+One-time compaction of price history into run-length form.
+
+Consecutive rows of a catalog product with the same price are collapsed into
+the first row of the run, whose `lastSeenAt` is set to the last observation.
+Run once when switching PRICE_HISTORY_MODE to "runlength":
+
+    python compact_history.py [--vacuum]
+
+--vacuum rewrites the table and its indexes afterwards so the freed space is
+returned to the operating system (takes an exclusive lock while it runs).
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from prisma import Prisma
+
+
+async def compact(vacuum: bool):
+    db = Prisma()
+    await db.connect()
+    try:
+        before = await db.pricehistory.count()
+        print(f"Compacting {before} price history rows...")
+
+        async with db.tx(timeout=timedelta(minutes=30), max_wait=timedelta(seconds=30)) as tx:
+            # Number each run of unchanged prices and pick its first row as the keeper
+            await tx.execute_raw(
+                '''
+                CREATE TEMP TABLE history_runs ON COMMIT DROP AS
+                SELECT id,
+                       COALESCE("lastSeenAt", timestamp) AS seen,
+                       FIRST_VALUE(id) OVER (PARTITION BY "catalogId", run ORDER BY timestamp) AS keeper
+                FROM (
+                    SELECT *, SUM(changed) OVER (PARTITION BY "catalogId" ORDER BY timestamp) AS run
+                    FROM (
+                        SELECT id, "catalogId", timestamp, "lastSeenAt",
+                               CASE WHEN price IS DISTINCT FROM LAG(price) OVER (
+                                   PARTITION BY "catalogId" ORDER BY timestamp
+                               ) THEN 1 ELSE 0 END AS changed
+                        FROM price_history
+                        WHERE "catalogId" IS NOT NULL
+                    ) AS marked
+                ) AS numbered
+                '''
+            )
+            await tx.execute_raw(
+                '''
+                UPDATE price_history AS ph
+                SET "lastSeenAt" = r.last_seen
+                FROM (SELECT keeper, MAX(seen) AS last_seen FROM history_runs GROUP BY keeper) AS r
+                WHERE ph.id = r.keeper
+                '''
+            )
+            await tx.execute_raw(
+                '''
+                DELETE FROM price_history AS ph
+                USING history_runs AS r
+                WHERE ph.id = r.id AND r.id <> r.keeper
+                '''
+            )
+
+        after = await db.pricehistory.count()
+        print(f"Done: {before} rows compacted to {after}")
+
+        if vacuum:
+            print("Rewriting price_history and its indexes...")
+            await db.execute_raw('VACUUM (FULL, ANALYZE) price_history')
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact price history into run-length form")
+    parser.add_argument("--vacuum", action="store_true", help="reclaim disk space afterwards")
+    args = parser.parse_args()
+    asyncio.run(compact(args.vacuum))
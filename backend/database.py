@@ -0,0 +1,143 @@
+"""
+One managed Prisma connection per process.
+
+DatabaseManager owns the client for its whole lifespan: it connects once at
+startup (retrying with exponential backoff), sizes Prisma's connection pool
+from DB_POOL_SIZE / DB_POOL_TIMEOUT, reports health, and reconnects with the
+same backoff if the engine goes away. Request handlers, the notification
+worker and the price check cycle all share `database.client` on the app's
+event loop instead of opening their own connections.
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from prisma import Prisma
+from prisma.engine.errors import EngineConnectionError, NotConnectedError
+from prisma.errors import ClientNotConnectedError, HTTPClientClosedError
+
+from metrics import instrument_prisma
+
+instrument_prisma(Prisma)
+
+# Errors meaning the query engine itself is unreachable, not that a query was slow or failed
+ENGINE_GONE_ERRORS = (EngineConnectionError, NotConnectedError, ClientNotConnectedError, HTTPClientClosedError)
+
+
+def pooled_url(url, pool_size=None, pool_timeout=None):
+    """DATABASE_URL with Prisma pool options added, unless the URL already sets them"""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    if pool_size:
+        query.setdefault('connection_limit', str(pool_size))
+    if pool_timeout:
+        query.setdefault('pool_timeout', str(pool_timeout))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class DatabaseManager:
+    def __init__(self, url=None, pool_size=None, pool_timeout=None,
+                 max_retries=None, base_delay=None, connect_timeout=None):
+        self.url = url or os.getenv('DATABASE_URL')
+        self.pool_size = pool_size or int(os.getenv('DB_POOL_SIZE', 0)) or None
+        self.pool_timeout = pool_timeout or int(os.getenv('DB_POOL_TIMEOUT', 10))
+        self.max_retries = max_retries or int(os.getenv('DB_CONNECT_RETRIES', 5))
+        self.base_delay = base_delay or float(os.getenv('DB_CONNECT_BASE_DELAY', 0.5))
+        self.connect_timeout = connect_timeout or int(os.getenv('DB_CONNECT_TIMEOUT', 10))
+
+        datasource = {'url': pooled_url(self.url, self.pool_size, self.pool_timeout)} if self.url else None
+        self.client = Prisma(datasource=datasource, connect_timeout=timedelta(seconds=self.connect_timeout))
+
+        self.lock = asyncio.Lock()
+        self.connected_at = None
+        self.reconnects = 0
+        self.reconnecting = None
+
+    async def connect(self):
+        """Connect with exponential backoff; the last failure is re-raised"""
+        async with self.lock:
+            if self.client.is_connected():
+                return
+
+            for attempt in range(1, self.max_retries + 1):
+                try:
+                    await self.client.connect()
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.base_delay * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+                    print(f"Database connect attempt {attempt} failed ({e}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+            self.connected_at = time.time()
+            print(f"Database connected (pool size {self.pool_size or 'default'})")
+
+    async def ensure_connected(self):
+        """Cheap check for request paths; only reconnects when the client is down"""
+        if not self.client.is_connected():
+            self.reconnects += 1
+            await self.connect()
+        return self.client
+
+    async def reconnect(self):
+        async with self.lock:
+            try:
+                await self.client.disconnect()
+            except Exception:
+                pass
+        self.reconnects += 1
+        await self.connect()
+
+    async def disconnect(self):
+        async with self.lock:
+            if self.client.is_connected():
+                await self.client.disconnect()
+
+    def reconnect_in_background(self):
+        """Start one reconnect task unless one is already running"""
+        if self.reconnecting is None or self.reconnecting.done():
+            self.reconnecting = asyncio.create_task(self.reconnect())
+            self.reconnecting.add_done_callback(self._report_reconnect)
+        return self.reconnecting
+
+    @staticmethod
+    def _report_reconnect(task):
+        if not task.cancelled() and task.exception():
+            print(f"Background database reconnect failed ({task.exception()}), retrying on the next health check or cycle")
+
+    async def health(self):
+        """Round-trip a trivial query; failures are re-raised so the probe reports 503.
+
+        A slow or failing query leaves the shared pool alone. Only a client
+        that is disconnected or whose engine is gone gets a reconnect, and that
+        runs in the background so the probe itself never waits on backoff.
+        """
+        started = time.perf_counter()
+        if not self.client.is_connected():
+            self.reconnect_in_background()
+            raise ClientNotConnectedError()
+
+        try:
+            await self.client.query_raw('SELECT 1')
+        except ENGINE_GONE_ERRORS as e:
+            print(f"Database health check failed, engine unreachable ({e}); reconnecting in the background")
+            self.reconnect_in_background()
+            raise
+        except Exception as e:
+            print(f"Database health check failed ({e})")
+            raise
+
+        return {
+            "status": "connected",
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "pool_size": self.pool_size,
+            "connected_since": self.connected_at,
+            "reconnects": self.reconnects
+        }
+
+
+database = DatabaseManager()
@@ -0,0 +1,34 @@
+"""
+Helpers for the raw SQL used on hot paths.
+
+Prisma column names are the camelCase field names, so they must be quoted in
+raw queries (e.g. "currentPrice"). Timestamps are stored as UTC without a
+time zone, hence UTC_NOW instead of a bare NOW().
+"""
+
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+UTC_NOW = "timezone('UTC', NOW())"
+
+# Query parameters understood by Prisma's engine but rejected by libpq/asyncpg
+PRISMA_URL_PARAMS = {'schema', 'connection_limit', 'pool_timeout', 'pgbouncer', 'socket_timeout', 'connect_timeout', 'statement_cache_size'}
+
+
+def asyncpg_dsn(url):
+    """Strip Prisma-only options from DATABASE_URL so asyncpg can connect with it"""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key not in PRISMA_URL_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def values_list(rows, casts):
+    """Build a `($1, $2::type), ...` placeholder list for VALUES and its flattened params"""
+    placeholders = []
+    params = []
+    for row in rows:
+        columns = []
+        for value, cast in zip(row, casts):
+            params.append(value)
+            columns.append(f"${len(params)}{cast}")
+        placeholders.append(f"({', '.join(columns)})")
+    return ', '.join(placeholders), params
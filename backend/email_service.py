@@ -1,7 +1,11 @@
 import base64
+import html
 import os
 import random
 import string
+import threading
+from string import Template
+from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from google.auth.transport.requests import Request
@@ -9,11 +13,21 @@ from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from tracing import tracer
+
 SCOPES = ['https://www.googleapis.com/auth/gmail.send']
 
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = int(os.getenv('GMAIL_TOKEN_REFRESH_MARGIN', 300))
+# Gmail recommends at most 50 requests per batch
+BATCH_SIZE = int(os.getenv('GMAIL_BATCH_SIZE', 50))
+
 class GmailService:
     def __init__(self):
         self.service = None
+        self.creds = None
+        # httplib2 connections are not thread-safe, so API calls are serialized
+        self.lock = threading.Lock()
         self.setup_gmail_service()
     
     def setup_gmail_service(self):
@@ -29,7 +43,7 @@ class GmailService:
                 return
             
             # Create credentials object
-            creds = Credentials(
+            self.creds = Credentials(
                 token=None,
                 refresh_token=refresh_token,
                 token_uri='https://oauth2.googleapis.com/token',
@@ -39,15 +53,41 @@ class GmailService:
             )
             
             # Refresh the token
-            creds.refresh(Request())
+            self.ensure_token()
             
-            # Build the service
-            self.service = build('gmail', 'v1', credentials=creds)
+            # Build the service once, without re-fetching the discovery document
+            self.service = build('gmail', 'v1', credentials=self.creds, cache_discovery=False)
             print("Gmail API service initialized successfully")
             
         except Exception as e:
             print(f"Failed to setup Gmail service: {e}")
     
+    def ensure_token(self):
+        """Refresh the access token only when it is missing or close to expiry"""
+        expiry = self.creds.expiry
+        if self.creds.token and expiry and expiry - datetime.utcnow() > timedelta(seconds=TOKEN_REFRESH_MARGIN):
+            return
+        self.creds.refresh(Request())
+    
+    @staticmethod
+    def build_message(to_email: str, subject: str, html_content: str, text_content: str = None):
+        """Build the base64url-encoded MIME message the Gmail API expects"""
+        message = MIMEMultipart('alternative')
+        message['to'] = to_email
+        message['from'] = os.getenv('GMAIL_USER', 'noreply@pricepulse.com')
+        message['subject'] = subject
+        
+        # Add text version if provided
+        if text_content:
+            text_part = MIMEText(text_content, 'plain')
+            message.attach(text_part)
+        
+        # Add HTML version
+        html_part = MIMEText(html_content, 'html')
+        message.attach(html_part)
+        
+        return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
+    
     def send_email(self, to_email: str, subject: str, html_content: str, text_content: str = None):
         """Send email using Gmail API"""
         if not self.service:
@@ -55,28 +95,15 @@ class GmailService:
             return False
             
         try:
-            message = MIMEMultipart('alternative')
-            message['to'] = to_email
-            message['from'] = os.getenv('GMAIL_USER', 'noreply@pricepulse.com')
-            message['subject'] = subject
-            
-            # Add text version if provided
-            if text_content:
-                text_part = MIMEText(text_content, 'plain')
-                message.attach(text_part)
-            
-            # Add HTML version
-            html_part = MIMEText(html_content, 'html')
-            message.attach(html_part)
-            
-            # Encode message
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+            body = self.build_message(to_email, subject, html_content, text_content)
             
             # Send message
-            send_message = self.service.users().messages().send(
-                userId='me',
-                body={'raw': raw_message}
-            ).execute()
+            with self.lock, tracer.start_as_current_span('gmail.send'):
+                self.ensure_token()
+                send_message = self.service.users().messages().send(
+                    userId='me',
+                    body=body
+                ).execute()
             
             print(f"Email sent successfully to {to_email}. Message ID: {send_message['id']}")
             return True
@@ -87,18 +114,58 @@ class GmailService:
         except Exception as error:
             print(f"Email sending error: {error}")
             return False
+    
+    def send_batch(self, messages):
+        """Send (to_email, subject, html_content, text_content) messages in Gmail batch requests"""
+        results = [False] * len(messages)
+        if not self.service:
+            print("Gmail service not initialized")
+            return results
+        
+        def on_response(request_id, response, exception):
+            index = int(request_id)
+            if exception:
+                print(f"Gmail API error for {messages[index][0]}: {exception}")
+            else:
+                results[index] = True
+        
+        for start in range(0, len(messages), BATCH_SIZE):
+            try:
+                with self.lock, tracer.start_as_current_span('gmail.batch_request', attributes={'email.messages': min(BATCH_SIZE, len(messages) - start)}):
+                    self.ensure_token()
+                    batch = self.service.new_batch_http_request(callback=on_response)
+                    for index in range(start, min(start + BATCH_SIZE, len(messages))):
+                        batch.add(
+                            self.service.users().messages().send(
+                                userId='me',
+                                body=self.build_message(*messages[index])
+                            ),
+                            request_id=str(index)
+                        )
+                    batch.execute()
+            except Exception as error:
+                print(f"Email batch sending error: {error}")
+        
+        print(f"Batch sent {sum(results)} of {len(messages)} emails")
+        return results
+
+_gmail_service = None
+_gmail_service_lock = threading.Lock()
+
+def get_gmail_service():
+    """Process-wide Gmail client, created on first use and retried until it initializes"""
+    global _gmail_service
+    with _gmail_service_lock:
+        if _gmail_service is None or _gmail_service.service is None:
+            _gmail_service = GmailService()
+        return _gmail_service
 
 def generate_otp():
     """Generate 6-digit OTP"""
     return ''.join(random.choices(string.digits, k=6))
 
-def send_otp_email(email: str, otp: str):
-    """Send OTP verification email"""
-    gmail_service = GmailService()
-    
-    subject = "Verify Your PricePulse Account"
-    
-    html_content = f"""
+# Templates are parsed once at import; rendering is a single substitution pass
+OTP_HTML = Template("""
     <div style='font-family: Inter, Arial, sans-serif; max-width: 600px; margin: 0 auto; background: #f9fafb; padding: 40px 20px;'>
         <div style='background: white; border-radius: 16px; padding: 40px; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08);'>
             <div style='text-align: center; margin-bottom: 32px;'>
@@ -114,7 +181,7 @@ def send_otp_email(email: str, otp: str):
             
             <div style='background: #F3F4F6; border-radius: 12px; padding: 24px; text-align: center; margin: 24px 0;'>
                 <div style='font-size: 32px; font-weight: 800; color: #4F46E5; letter-spacing: 8px; font-family: monospace;'>
-                    {otp}
+                    $otp
                 </div>
                 <p style='color: #6B7280; font-size: 14px; margin: 8px 0 0 0;'>This code expires in 10 minutes</p>
             </div>
@@ -130,29 +197,21 @@ def send_otp_email(email: str, otp: str):
             </div>
         </div>
     </div>
-    """
-    
-    text_content = f"""
+    """)
+
+OTP_TEXT = Template("""
     PricePulse - Verify Your Account
     
     Welcome to PricePulse! Please use the verification code below to complete your account setup:
     
-    Verification Code: {otp}
+    Verification Code: $otp
     
     This code expires in 10 minutes.
     
     If you didn't create an account with PricePulse, please ignore this email.
-    """
-    
-    return gmail_service.send_email(email, subject, html_content, text_content)
+    """)
 
-def send_price_alert_email(email: str, product_name: str, price: float, url: str):
-    """Send price alert email"""
-    gmail_service = GmailService()
-    
-    subject = f"Price Alert: {product_name} dropped to ₹{price:,.2f}!"
-    
-    html_content = f"""
+ALERT_HTML = Template("""
     <div style='font-family: Inter, Arial, sans-serif; max-width: 600px; margin: 0 auto; background: #f9fafb; padding: 40px 20px;'>
         <div style='background: white; border-radius: 16px; padding: 40px; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08);'>
             <div style='text-align: center; margin-bottom: 32px;'>
@@ -165,17 +224,17 @@ def send_price_alert_email(email: str, product_name: str, price: float, url: str
                 <p style='color: #059669; margin: 0; font-weight: 600;'>The price has dropped to your target!</p>
             </div>
             
-            <h3 style='color: #111827; font-size: 18px; font-weight: 600; margin-bottom: 16px;'>{product_name}</h3>
+            <h3 style='color: #111827; font-size: 18px; font-weight: 600; margin-bottom: 16px;'>$product_name</h3>
             
             <div style='background: #F3F4F6; border-radius: 12px; padding: 20px; margin: 20px 0;'>
                 <div style='display: flex; justify-content: space-between; align-items: center;'>
                     <span style='color: #6B7280; font-size: 14px;'>Current Price:</span>
-                    <span style='color: #10B981; font-size: 24px; font-weight: 800;'>₹{price:,.2f}</span>
+                    <span style='color: #10B981; font-size: 24px; font-weight: 800;'>$price</span>
                 </div>
             </div>
             
             <div style='text-align: center; margin: 32px 0;'>
-                <a href='{url}' style='display: inline-block; background: #4F46E5; color: white; padding: 16px 32px; border-radius: 12px; text-decoration: none; font-weight: 600; font-size: 16px;'>
+                <a href='$url' style='display: inline-block; background: #4F46E5; color: white; padding: 16px 32px; border-radius: 12px; text-decoration: none; font-weight: 600; font-size: 16px;'>
                     View on Amazon
                 </a>
             </div>
@@ -194,20 +253,131 @@ def send_price_alert_email(email: str, product_name: str, price: float, url: str
             </div>
         </div>
     </div>
-    """
-    
-    text_content = f"""
+    """)
+
+ALERT_TEXT = Template("""
     PricePulse - Price Alert!
     
     Great News! The price has dropped to your target!
     
-    Product: {product_name}
-    Current Price: ₹{price:,.2f}
+    Product: $product_name
+    Current Price: $price
     
-    View on Amazon: {url}
+    View on Amazon: $url
     
     You're receiving this alert because you set a price target for this product.
     Happy shopping with PricePulse!
-    """
+    """)
+
+DIGEST_HTML = Template("""
+    <div style='font-family: Inter, Arial, sans-serif; max-width: 600px; margin: 0 auto; background: #f9fafb; padding: 40px 20px;'>
+        <div style='background: white; border-radius: 16px; padding: 40px; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08);'>
+            <div style='text-align: center; margin-bottom: 32px;'>
+                <h1 style='color: #4F46E5; font-size: 24px; font-weight: 800; margin: 0;'>PricePulse</h1>
+                <p style='color: #6B7280; margin: 8px 0 0 0;'>Price Alert Notification</p>
+            </div>
+            
+            <div style='background: #DCFCE7; border-radius: 12px; padding: 24px; margin-bottom: 24px; text-align: center;'>
+                <h2 style='color: #10B981; font-size: 18px; font-weight: 700; margin: 0 0 8px 0;'>Great News!</h2>
+                <p style='color: #059669; margin: 0; font-weight: 600;'>$count of your tracked products dropped to your target!</p>
+            </div>
+            
+$items
+            <div style='border-top: 1px solid #E5E7EB; padding-top: 24px;'>
+                <p style='color: #6B7280; font-size: 14px; line-height: 1.6; margin: 0;'>
+                    You're receiving this alert because you set price targets for these products. 
+                    <br>Happy shopping with PricePulse!
+                </p>
+            </div>
+            
+            <div style='text-align: center; margin-top: 24px;'>
+                <p style='color: #9CA3AF; font-size: 12px; margin: 0;'>
+                    © 2024 PricePulse. All rights reserved.
+                </p>
+            </div>
+        </div>
+    </div>
+    """)
+
+DIGEST_ITEM_HTML = Template("""            <h3 style='color: #111827; font-size: 18px; font-weight: 600; margin-bottom: 16px;'>$product_name</h3>
+            
+            <div style='background: #F3F4F6; border-radius: 12px; padding: 20px; margin: 20px 0;'>
+                <div style='display: flex; justify-content: space-between; align-items: center;'>
+                    <span style='color: #6B7280; font-size: 14px;'>Current Price:</span>
+                    <span style='color: #10B981; font-size: 24px; font-weight: 800;'>$price</span>
+                </div>
+            </div>
+            
+            <div style='text-align: center; margin: 16px 0 32px 0;'>
+                <a href='$url' style='display: inline-block; background: #4F46E5; color: white; padding: 16px 32px; border-radius: 12px; text-decoration: none; font-weight: 600; font-size: 16px;'>
+                    View on Amazon
+                </a>
+            </div>
+            
+""")
+
+DIGEST_TEXT = Template("""
+    PricePulse - Price Alert!
+    
+    Great News! $count of your tracked products dropped to your target!
+    
+$items
+    You're receiving this alert because you set price targets for these products.
+    Happy shopping with PricePulse!
+    """)
+
+DIGEST_ITEM_TEXT = Template("""    Product: $product_name
+    Current Price: $price
+    View on Amazon: $url
     
-    return gmail_service.send_email(email, subject, html_content, text_content)
\ No newline at end of file
+""")
+
+def format_price(price: float):
+    return f"₹{price:,.2f}"
+
+def alert_fields(product_name: str, price: float, url: str, escape: bool):
+    if escape:
+        return {"product_name": html.escape(product_name), "price": format_price(price), "url": html.escape(url, quote=True)}
+    return {"product_name": product_name, "price": format_price(price), "url": url}
+
+def render_otp(otp: str):
+    """Build subject, HTML and text bodies of an OTP verification email"""
+    subject = "Verify Your PricePulse Account"
+    return subject, OTP_HTML.substitute(otp=otp), OTP_TEXT.substitute(otp=otp)
+
+def send_otp_email(email: str, otp: str):
+    """Send OTP verification email"""
+    return get_gmail_service().send_email(email, *render_otp(otp))
+
+def render_price_alert(product_name: str, price: float, url: str):
+    """Build subject, HTML and text bodies of a price alert email"""
+    subject = f"Price Alert: {product_name} dropped to {format_price(price)}!"
+    html_content = ALERT_HTML.substitute(alert_fields(product_name, price, url, escape=True))
+    text_content = ALERT_TEXT.substitute(alert_fields(product_name, price, url, escape=False))
+    return subject, html_content, text_content
+
+def render_price_alert_digest(items):
+    """Build one email covering several {"product_name", "price", "url"} alerts"""
+    count = len(items)
+    subject = f"Price Alert: {count} of your products dropped to your target!"
+    html_items = "".join(
+        DIGEST_ITEM_HTML.substitute(alert_fields(item["product_name"], item["price"], item["url"], escape=True))
+        for item in items
+    )
+    text_items = "".join(
+        DIGEST_ITEM_TEXT.substitute(alert_fields(item["product_name"], item["price"], item["url"], escape=False))
+        for item in items
+    )
+    return (
+        subject,
+        DIGEST_HTML.substitute(count=count, items=html_items),
+        DIGEST_TEXT.substitute(count=count, items=text_items)
+    )
+
+def send_price_alert_email(email: str, product_name: str, price: float, url: str):
+    """Send price alert email"""
+    return get_gmail_service().send_email(email, *render_price_alert(product_name, price, url))
+
+def send_many_emails(messages):
+    """Send many (email, subject, html_content, text_content) messages in batched Gmail requests"""
+    return get_gmail_service().send_batch(messages)
@@ -1,4 +1,9 @@
 import os
+import re
+import json
+import time
+import asyncio
+import importlib.util
 import httpx
 import jwt
 from urllib.parse import urlencode
@@ -10,6 +15,97 @@ GOOGLE_CLIENT_ID = os.getenv("GOOGLE_OAUTH_CLIENT_ID") or os.getenv("GMAIL_CLIEN
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_OAUTH_CLIENT_SECRET") or os.getenv("GMAIL_CLIENT_SECRET")
 GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:3000/auth/callback")
 
+# ID token verification; GOOGLE_JWKS_FILE serves keys from a local file instead (tests, offline dev)
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_JWKS_FILE = os.getenv("GOOGLE_JWKS_FILE")
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+JWKS_DEFAULT_MAX_AGE = int(os.getenv("GOOGLE_JWKS_DEFAULT_MAX_AGE", 3600))
+JWKS_MIN_REFRESH_INTERVAL = 30
+
+# HTTP/2 needs the optional h2 package (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled client; created lazily so scripts work without the app lifespan"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+        )
+    return http_client
+
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+def cache_max_age(headers) -> int:
+    """Seconds the response may be cached for, from Cache-Control max-age minus Age"""
+    match = re.search(r"max-age=(\d+)", headers.get("cache-control", ""))
+    if not match:
+        return JWKS_DEFAULT_MAX_AGE
+    return max(0, int(match.group(1)) - int(headers.get("age", 0) or 0))
+
+
+class JWKSCache:
+    """Google's signing keys, refreshed when the cached copy expires or an unknown kid shows up"""
+
+    def __init__(self, url=None, path=None):
+        self.url = url or GOOGLE_JWKS_URL
+        self.path = path if path is not None else GOOGLE_JWKS_FILE
+        self.keys = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def fetch(self):
+        if self.path:
+            with open(self.path) as f:
+                return json.load(f), JWKS_DEFAULT_MAX_AGE
+
+        response = await get_http_client().get(self.url)
+        response.raise_for_status()
+        return response.json(), cache_max_age(response.headers)
+
+    async def refresh(self):
+        jwks, max_age = await self.fetch()
+        self.keys = {
+            key["kid"]: jwt.PyJWK(key)
+            for key in jwks.get("keys", [])
+            if key.get("kid") and key.get("use", "sig") == "sig"
+        }
+        self.fetched_at = time.monotonic()
+        self.expires_at = self.fetched_at + max_age
+
+    async def get_key(self, kid: str):
+        now = time.monotonic()
+        if kid in self.keys and now < self.expires_at:
+            return self.keys[kid]
+
+        async with self.lock:
+            # Another request may have refreshed while we waited; rotated keys
+            # can trigger a refresh early, but not more than every few seconds
+            now = time.monotonic()
+            stale = now >= self.expires_at
+            unknown = kid not in self.keys and now - self.fetched_at >= JWKS_MIN_REFRESH_INTERVAL
+            if stale or unknown:
+                await self.refresh()
+
+        if kid not in self.keys:
+            raise Exception(f"Unknown signing key: {kid}")
+        return self.keys[kid]
+
+
+jwks_cache = JWKSCache()
+
 class GoogleAuth:
     @staticmethod
     def get_auth_url() -> str:
@@ -27,57 +123,62 @@ class GoogleAuth:
     @staticmethod
     async def exchange_code_for_tokens(code: str) -> Dict[str, Any]:
         """Exchange authorization code for tokens"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "client_id": GOOGLE_CLIENT_ID,
-                    "client_secret": GOOGLE_CLIENT_SECRET,
-                    "code": code,
-                    "grant_type": "authorization_code",
-                    "redirect_uri": GOOGLE_REDIRECT_URI,
-                }
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Token exchange failed: {response.text}")
-            
-            return response.json()
+        response = await get_http_client().post(
+            "https://oauth2.googleapis.com/token",
+            data={
+                "client_id": GOOGLE_CLIENT_ID,
+                "client_secret": GOOGLE_CLIENT_SECRET,
+                "code": code,
+                "grant_type": "authorization_code",
+                "redirect_uri": GOOGLE_REDIRECT_URI,
+            }
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Token exchange failed: {response.text}")
+        
+        return response.json()
     
     @staticmethod
-    def decode_id_token(id_token: str) -> Dict[str, Any]:
-        """Decode and verify ID token"""
+    async def decode_id_token(id_token: str) -> Dict[str, Any]:
+        """Decode and verify ID token against Google's cached signing keys"""
         try:
-            # Decode without verification for now (in production, verify signature)
-            decoded = jwt.decode(id_token, options={"verify_signature": False})
-            return decoded
+            header = jwt.get_unverified_header(id_token)
+            key = await jwks_cache.get_key(header.get("kid"))
+            return jwt.decode(
+                id_token,
+                key=key,
+                algorithms=["RS256"],
+                audience=GOOGLE_CLIENT_ID,
+                issuer=GOOGLE_ISSUERS,
+                leeway=30,
+            )
         except Exception as e:
             raise Exception(f"Invalid ID token: {str(e)}")
     
     @staticmethod
     async def refresh_access_token(refresh_token: str) -> Dict[str, Any]:
         """Refresh Google access token"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "client_id": GOOGLE_CLIENT_ID,
-                    "client_secret": GOOGLE_CLIENT_SECRET,
-                    "refresh_token": refresh_token,
-                    "grant_type": "refresh_token",
-                }
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Token refresh failed: {response.text}")
-            
-            return response.json()
+        response = await get_http_client().post(
+            "https://oauth2.googleapis.com/token",
+            data={
+                "client_id": GOOGLE_CLIENT_ID,
+                "client_secret": GOOGLE_CLIENT_SECRET,
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token",
+            }
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Token refresh failed: {response.text}")
+        
+        return response.json()
     
     @staticmethod
     async def revoke_token(token: str) -> bool:
         """Revoke Google token"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://oauth2.googleapis.com/revoke?token={token}"
-            )
-            return response.status_code == 200
\ No newline at end of file
+        response = await get_http_client().post(
+            "https://oauth2.googleapis.com/revoke",
+            params={"token": token}
+        )
+        return response.status_code == 200
\ No newline at end of file
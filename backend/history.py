@@ -0,0 +1,147 @@
+"""
+Price history storage and read-side expansion.
+
+PRICE_HISTORY_MODE selects how observations are stored:
+
+- "full": one row per observation (the original behaviour)
+- "runlength": a row is only written when the price changes. `timestamp` is
+  when that price was first seen and `lastSeenAt` is extended on every
+  unchanged observation.
+
+Reads go through expand_runs, which turns runs back into a regular series
+so the API shape is the same in both modes, and downsample, which bounds the
+number of points sent to the chart.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from db_utils import UTC_NOW, values_list
+
+HISTORY_MODE = os.getenv('PRICE_HISTORY_MODE', 'full')
+HISTORY_STEP = timedelta(minutes=int(os.getenv('PRICE_HISTORY_STEP_MINUTES', 60)))
+HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', 1000))
+
+
+async def append_history(db, prices):
+    """Record a list of (catalog_id, price) observations according to PRICE_HISTORY_MODE"""
+    if not prices:
+        return
+
+    now = datetime.utcnow()
+    runlength = HISTORY_MODE == 'runlength'
+
+    if runlength:
+        # Extend the latest run of every product whose price hasn't moved
+        values, params = values_list(prices, ('', '::double precision'))
+        extended = await db.query_raw(
+            f'''
+            WITH v(id, price) AS (VALUES {values}),
+            latest AS (
+                SELECT DISTINCT ON (ph."catalogId") ph.id, ph."catalogId", ph.price
+                FROM price_history AS ph
+                JOIN v ON ph."catalogId" = v.id
+                ORDER BY ph."catalogId", ph.timestamp DESC
+            )
+            UPDATE price_history AS ph
+            SET "lastSeenAt" = {UTC_NOW}
+            FROM latest
+            JOIN v ON v.id = latest."catalogId"
+            WHERE ph.id = latest.id AND latest.price = v.price
+            RETURNING ph."catalogId"
+            ''',
+            *params
+        )
+        unchanged = {row['catalogId'] for row in extended}
+        prices = [(catalog_id, price) for catalog_id, price in prices if catalog_id not in unchanged]
+
+    if prices:
+        await db.pricehistory.create_many(
+            data=[
+                {
+                    "catalogId": catalog_id,
+                    "price": price,
+                    "timestamp": now,
+                    "lastSeenAt": now if runlength else None
+                }
+                for catalog_id, price in prices
+            ]
+        )
+
+
+def expand_runs(rows, step=None):
+    """Expand stored rows into a regular series of {"id", "price", "timestamp"} points"""
+    step = step or HISTORY_STEP
+    points = []
+    for row in rows:
+        points.append({"id": row.id, "price": row.price, "timestamp": row.timestamp})
+
+        if not row.lastSeenAt or row.lastSeenAt <= row.timestamp:
+            continue
+
+        index = 1
+        timestamp = row.timestamp + step
+        while timestamp < row.lastSeenAt:
+            points.append({"id": f"{row.id}:{index}", "price": row.price, "timestamp": timestamp})
+            index += 1
+            timestamp += step
+        points.append({"id": f"{row.id}:{index}", "price": row.price, "timestamp": row.lastSeenAt})
+
+    return points
+
+
+def to_utc(value):
+    """Treat naive query datetimes as UTC so they compare with stored timestamps"""
+    if value and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def history_where(catalog_id, start=None, end=None):
+    """Prisma filter for history rows overlapping [start, end], runs included"""
+    where = {"catalogId": catalog_id}
+    if start:
+        where["OR"] = [{"timestamp": {"gte": start}}, {"lastSeenAt": {"gte": start}}]
+    if end:
+        where["timestamp"] = {"lte": end}
+    return where
+
+
+def clip_points(points, start=None, end=None):
+    """Drop expanded points that fall outside [start, end]"""
+    if not start and not end:
+        return points
+    return [
+        point for point in points
+        if (not start or point["timestamp"] >= start) and (not end or point["timestamp"] <= end)
+    ]
+
+
+def downsample(points, max_points=None):
+    """Min/max-per-bucket downsampling that keeps the first and last point and every peak and trough"""
+    max_points = max_points or HISTORY_MAX_POINTS
+    count = len(points)
+    if count <= max_points or count < 3:
+        return points
+
+    prices = np.fromiter((point["price"] for point in points), dtype=float, count=count)
+
+    # Interior points are split into equal-width buckets; each keeps its min and max
+    buckets = max(1, (max_points - 2) // 2)
+    inner = np.arange(1, count - 1)
+    bucket = ((inner - 1) * buckets) // (count - 2)
+
+    # Sorting by (bucket, price) puts each bucket's min first and max last
+    order = np.lexsort((prices[inner], bucket))
+    sorted_bucket = bucket[order]
+    boundary = sorted_bucket[1:] != sorted_bucket[:-1]
+    first = np.concatenate(([True], boundary))
+    last = np.concatenate((boundary, [True]))
+
+    keep = np.unique(np.concatenate((
+        [0, count - 1],
+        inner[order[first]],
+        inner[order[last]]
+    )))
+    return [points[i] for i in keep]
@@ -0,0 +1,66 @@
+"""
+Postgres advisory-lock leader election.
+
+Every API process runs the price check loop, but only the process holding a
+session-level advisory lock actually runs a cycle. The lock lives on a
+dedicated asyncpg connection, so if the leader crashes or loses the database
+its session ends, Postgres releases the lock, and the next process to poll
+takes over.
+
+Session locks need a real Postgres session: when DATABASE_URL goes through
+PgBouncer in transaction mode, point LEADER_DATABASE_URL at the database
+directly.
+"""
+import hashlib
+import os
+
+import asyncpg
+
+from db_utils import asyncpg_dsn
+
+
+def lock_key(name):
+    """Stable signed 64-bit advisory lock key for a name"""
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], 'big', signed=True)
+
+
+class LeaderElection:
+    def __init__(self, name, url=None):
+        self.name = name
+        self.key = lock_key(name)
+        self.url = url or os.getenv('LEADER_DATABASE_URL') or os.getenv('DATABASE_URL')
+        self.conn = None
+        self.is_leader = False
+
+    async def acquire(self):
+        """Try to become (or confirm we still are) the leader; never raises"""
+        try:
+            if self.conn is None or self.conn.is_closed():
+                self.is_leader = False
+                self.conn = await asyncpg.connect(asyncpg_dsn(self.url))
+
+            if self.is_leader:
+                # The lock is held for as long as this session is alive
+                await self.conn.fetchval('SELECT 1')
+            else:
+                self.is_leader = await self.conn.fetchval('SELECT pg_try_advisory_lock($1)', self.key)
+                if self.is_leader:
+                    print(f"Acquired leadership for {self.name}")
+        except Exception as e:
+            if self.is_leader:
+                print(f"Lost leadership for {self.name}: {e}")
+            else:
+                print(f"Leader election for {self.name} failed: {e}")
+            await self.close()
+
+        return self.is_leader
+
+    async def close(self):
+        """Drop the session, releasing the lock if we held it"""
+        conn, self.conn = self.conn, None
+        self.is_leader = False
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close(timeout=5)
+            except Exception:
+                conn.terminate()
@@ -6,18 +6,33 @@ load_dotenv()
 
 import asyncio
 from datetime import datetime, timedelta
+from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
-from prisma import Prisma
-from apscheduler.schedulers.background import BackgroundScheduler
 
-from auth import create_access_token, verify_token, verify_password, get_password_hash
+from auth import create_access_token, verify_token, verify_password_async, get_password_hash_async, hash_pool, hash_pool_stats
 from scraper import scraper
-from email_service import send_otp_email, send_price_alert_email, generate_otp
-from google_auth import GoogleAuth
+from scrape_cache import scrape_cache
+from price_check import CheckEngine
+from catalog import canonicalize_url, catalog_where
+from price_writer import PriceWriter
+from history import append_history, expand_runs, history_where, clip_points, downsample, to_utc
+from rollups import ROLLUP_RESOLUTIONS, update_rollups, summarize
+from pagination import PAGE_ORDER, MAX_PAGE_SIZE, page_where, split_page, project
+from email_service import generate_otp
+from notifications import notifier, enqueue_email, release_digests, DIGEST_MODE
+from user_cache import user_cache
+from google_auth import GoogleAuth, get_http_client, close_http_client
+from database import database
+from leader import LeaderElection
+from scrape_queue import enqueue_cycle, outstanding_jobs
+from check_policy import ADAPTIVE_SCHEDULE, CHECK_BASE_INTERVAL, CHECK_TICK_SECONDS, CHECK_MAX_PER_TICK, claim_due_products
+from metrics import MetricsMiddleware, render_metrics
+from tracing import configure_tracing, shutdown_tracing, tracer
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -26,8 +41,15 @@ app = FastAPI(
     description="Smart Amazon Price Tracker with Google OAuth"
 )
 security = HTTPBearer()
-db = Prisma()
+db = database.client
 scheduler = None
+price_check_leader = LeaderElection("price-check")
+
+# The cycle runs every PRICE_CHECK_INTERVAL_SECONDS in whichever process holds the lock
+PRICE_CHECK_INTERVAL = float(os.getenv('PRICE_CHECK_INTERVAL_SECONDS', 3600))
+LEADER_POLL_INTERVAL = float(os.getenv('LEADER_POLL_SECONDS', 15))
+# "inline" scrapes in the leader process; "queue" only enqueues jobs for scrape_worker.py
+PRICE_CHECK_MODE = os.getenv('PRICE_CHECK_MODE', 'inline')
 
 # CORS middleware
 app.add_middleware(
@@ -38,6 +60,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms, served at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Pydantic models
 class UserCreate(BaseModel):
     email: EmailStr
@@ -68,19 +93,28 @@ class OTPVerify(BaseModel):
 class GoogleAuthCode(BaseModel):
     code: str
 
+# Fields returned by list endpoints with fields=slim
+SLIM_PRODUCT_FIELDS = ("id", "name", "image", "currentPrice", "url", "createdAt")
+SLIM_ALERT_FIELDS = ("id", "productId", "targetPrice", "email", "createdAt")
+
 # Dependency to get current user
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    user_id = verify_token(token)
-    
-    # Ensure database connection
-    if not db.is_connected():
-        await db.connect()
+    with tracer.start_as_current_span("auth.current_user") as span:
+        token = credentials.credentials
+        user_id = verify_token(token)
+        
+        # Most requests are served from the cache without a database round-trip
+        user = user_cache.get(user_id)
+        span.set_attribute("user_cache.hit", user is not None)
+        if user:
+            return user
         
-    user = await db.user.find_unique(where={"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+        await database.ensure_connected()
+        user = await db.user.find_unique(where={"id": user_id})
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user_cache.set(user_id, user)
+        return user
 
 @app.on_event("startup")
 async def startup():
@@ -98,29 +132,36 @@ async def startup():
             except Exception as e:
                 print(f"Prisma setup failed: {e}")
         
-        # Try to connect to database
+        # Try to connect to database (retries with backoff)
         try:
-            await db.connect()
-            print("Database connected successfully")
+            await database.connect()
         except Exception as db_error:
             print(f"Database connection failed: {db_error}")
             # Try one more time with fresh binaries
             try:
                 subprocess.run(["python", "-m", "prisma", "py", "fetch"], check=True)
                 subprocess.run(["python", "-m", "prisma", "generate"], check=True)
-                await db.connect()
+                await database.connect()
                 print("Database connected after fetching binaries")
             except Exception as fetch_error:
                 print(f"Failed to fetch binaries: {fetch_error}")
-                raise db_error
+                # Serve anyway: /health reports 503 and the scheduler waits until the reconnect succeeds
+                database.reconnect_in_background()
+        
+        # Export trace spans when TRACE_EXPORTER is set
+        configure_tracing("pricepulse-api")
+        
+        # Drain the outbound email queue on this event loop
+        notifier.start(db)
+        
+        # One pooled HTTP client for all Google OAuth calls
+        get_http_client()
         
         # Start scheduler (optional for deployment)
         global scheduler
         try:
-            scheduler = BackgroundScheduler()
-            scheduler.add_job(scheduled_price_check, 'interval', hours=1)  # Every hour
-            scheduler.start()
-            print("Price tracking scheduler started - checking every hour")
+            scheduler = asyncio.create_task(price_check_loop())
+            print(f"Price tracking scheduler started - checking every {PRICE_CHECK_INTERVAL:.0f}s when leader")
         except Exception as e:
             print(f"Warning: Could not start scheduler: {e}")
             
@@ -133,8 +174,15 @@ async def startup():
 async def shutdown():
     global scheduler
     if scheduler:
-        scheduler.shutdown()
-    await db.disconnect()
+        scheduler.cancel()
+        await asyncio.gather(scheduler, return_exceptions=True)
+    await price_check_leader.close()
+    scraper.shutdown()
+    hash_pool.shutdown(wait=False)
+    await notifier.stop()
+    await close_http_client()
+    await database.disconnect()
+    shutdown_tracing()
 
 @app.post("/api/auth/send-otp")
 async def send_otp(otp_request: OTPRequest):
@@ -159,11 +207,9 @@ async def send_otp(otp_request: OTPRequest):
         }
     )
     
-    # Send OTP email
-    if send_otp_email(otp_request.email, otp):
-        return {"message": "OTP sent successfully"}
-    else:
-        raise HTTPException(status_code=500, detail="Failed to send OTP")
+    # Queue OTP email - delivery happens off the request path
+    await enqueue_email(db, "otp", otp_request.email, {"otp": otp})
+    return {"message": "OTP sent successfully"}
 
 @app.post("/api/auth/verify-otp")
 async def verify_otp(otp_verify: OTPVerify):
@@ -186,7 +232,7 @@ async def verify_otp(otp_verify: OTPVerify):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user account
-    hashed_password = get_password_hash(otp_verify.password)
+    hashed_password = await get_password_hash_async(otp_verify.password)
     new_user = await db.user.create(
         data={
             "email": otp_verify.email,
@@ -198,6 +244,7 @@ async def verify_otp(otp_verify: OTPVerify):
     
     # Clean up OTP records
     await db.otpverification.delete_many(where={"email": otp_verify.email})
+    user_cache.invalidate(new_user.id)
     
     # Create token
     access_token = create_access_token(data={"sub": new_user.id})
@@ -228,7 +275,7 @@ async def register(user: UserCreate):
         raise HTTPException(status_code=400, detail="Email not verified. Please verify your email first.")
     
     # Create user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = await db.user.create(
         data={
             "email": user.email,
@@ -240,6 +287,7 @@ async def register(user: UserCreate):
     
     # Clean up OTP records
     await db.otpverification.delete_many(where={"email": user.email})
+    user_cache.invalidate(new_user.id)
     
     # Create token
     access_token = create_access_token(data={"sub": new_user.id})
@@ -254,7 +302,7 @@ async def register(user: UserCreate):
 async def login(user: UserLogin):
     # Find user
     db_user = await db.user.find_unique(where={"email": user.email})
-    if not db_user or not verify_password(user.password, db_user.password):
+    if not db_user or not db_user.password or not await verify_password_async(user.password, db_user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create token
@@ -283,7 +331,7 @@ async def google_auth_callback(auth_data: GoogleAuthCode):
         print(f"DEBUG: Token exchange successful, got tokens: {list(tokens.keys())}")
         
         # Decode ID token to get user info
-        user_info = GoogleAuth.decode_id_token(tokens["id_token"])
+        user_info = await GoogleAuth.decode_id_token(tokens["id_token"])
         print(f"DEBUG: Decoded user info: {user_info.get('email')}")
         
         google_id = user_info["sub"]
@@ -291,14 +339,6 @@ async def google_auth_callback(auth_data: GoogleAuthCode):
         name = user_info.get("name")
         picture = user_info.get("picture")
         
-        # Ensure fresh database connection
-        try:
-            await db.disconnect()
-        except:
-            pass
-        await db.connect()
-        print("DEBUG: Database reconnected")
-        
         # Check if user exists by Google ID or email
         existing_user = await db.user.find_first(
             where={
@@ -336,6 +376,8 @@ async def google_auth_callback(auth_data: GoogleAuthCode):
                 }
             )
         
+        user_cache.invalidate(user.id)
+        
         # Create our own JWT token
         access_token = create_access_token(data={"sub": user.id})
         print(f"DEBUG: Successfully created JWT token for user: {user.id}")
@@ -383,6 +425,7 @@ async def logout(current_user = Depends(get_current_user)):
                 where={"id": current_user.id},
                 data={"refreshToken": None}
             )
+            user_cache.invalidate(current_user.id)
         
         return {"message": "Logged out successfully"}
     except Exception as e:
@@ -391,60 +434,183 @@ async def logout(current_user = Depends(get_current_user)):
 
 @app.post("/api/products/track")
 async def track_product(product: ProductTrack, current_user = Depends(get_current_user)):
-    # Scrape product data
-    scraped_data = await scraper.scrape_amazon(product.url)
-    
-    if not scraped_data or not scraped_data.get('name') or not scraped_data.get('price'):
-        raise HTTPException(status_code=400, detail="Could not scrape product data")
-    
-    # Create product
-    new_product = await db.product.create(
-        data={
-            "url": product.url,
-            "name": scraped_data['name'],
-            "image": scraped_data.get('image'),
-            "currentPrice": scraped_data['price'],
-            "userId": current_user.id
-        }
-    )
-    
-    # Add initial price history
-    await db.pricehistory.create(
-        data={
-            "price": scraped_data['price'],
-            "productId": new_product.id
-        }
-    )
+    # Products are shared by marketplace + ASIN, so a known item needs no scrape
+    key = canonicalize_url(product.url)
+    catalog = None
+    if key:
+        with tracer.start_as_current_span("track.catalog_lookup"):
+            catalog = await db.catalogproduct.find_unique(where=catalog_where(key[0], key[1]))
+    
+    if not catalog:
+        # Scrape product data
+        with tracer.start_as_current_span("track.scrape"):
+            scraped_data = await scraper.scrape_amazon(product.url)
+        
+        if not scraped_data or not scraped_data.get('name') or not scraped_data.get('price'):
+            raise HTTPException(status_code=400, detail="Could not scrape product data")
+        
+        # Short links only reveal their ASIN after the redirect
+        key = key or canonicalize_url(scraped_data.get('url'))
+        if not key:
+            raise HTTPException(status_code=400, detail="Could not identify Amazon product from URL")
+        
+        marketplace, asin, canonical_url = key
+        with tracer.start_as_current_span("track.persist"):
+            catalog = await db.catalogproduct.upsert(
+                where=catalog_where(marketplace, asin),
+                data={
+                    "create": {
+                        "marketplace": marketplace,
+                        "asin": asin,
+                        "url": canonical_url,
+                        "name": scraped_data['name'],
+                        "image": scraped_data.get('image'),
+                        "currentPrice": scraped_data['price'],
+                        "lastCheckedAt": datetime.utcnow(),
+                        # Just scraped, so don't let the next scheduler tick check it again
+                        "nextCheckAt": datetime.utcnow() + timedelta(seconds=CHECK_BASE_INTERVAL)
+                    },
+                    "update": {
+                        "currentPrice": scraped_data['price'],
+                        "lastCheckedAt": datetime.utcnow()
+                    }
+                }
+            )
+            
+            # Add price history to the shared series
+            await append_history(db, [(catalog.id, scraped_data['price'])])
+            await update_rollups(db, [(catalog.id, scraped_data['price'])])
+    
+    with tracer.start_as_current_span("track.subscribe"):
+        # Tracking the same item twice returns the existing subscription
+        existing_product = await db.product.find_first(
+            where={"userId": current_user.id, "catalogId": catalog.id}
+        )
+        if existing_product:
+            return {"product_id": existing_product.id, "name": existing_product.name}
+        
+        # Create product
+        new_product = await db.product.create(
+            data={
+                "url": product.url,
+                "name": catalog.name,
+                "image": catalog.image,
+                "currentPrice": catalog.currentPrice,
+                "userId": current_user.id,
+                "catalogId": catalog.id
+            }
+        )
     
     return {"product_id": new_product.id, "name": new_product.name}
 
 @app.get("/api/products")
-async def get_products(current_user = Depends(get_current_user)):
+async def get_products(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, pattern="^(full|slim)$"),
+    current_user = Depends(get_current_user)
+):
+    slim = fields == "slim"
     products = await db.product.find_many(
-        where={"userId": current_user.id},
-        include={"priceHistory": {"order_by": {"timestamp": "desc"}, "take": 1}}
+        where=page_where({"userId": current_user.id}, cursor),
+        order=PAGE_ORDER,
+        take=limit + 1 if limit else None,
+        include=None if slim else {"catalog": {"include": {"priceHistory": {"order_by": {"timestamp": "desc"}, "take": 1}}}}
     )
-    return {"products": products}
+    products, next_cursor = split_page(products, limit)
+    
+    if slim:
+        return {"products": project(products, SLIM_PRODUCT_FIELDS), "next_cursor": next_cursor}
+    
+    # Price history lives on the shared catalog entry
+    for product in products:
+        product.priceHistory = product.catalog.priceHistory if product.catalog else []
+        product.catalog = None
+    
+    return {"products": products, "next_cursor": next_cursor}
 
 @app.get("/api/products/{product_id}")
-async def get_product(product_id: str, current_user = Depends(get_current_user)):
+async def get_product(
+    product_id: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    max_points: Optional[int] = Query(None, ge=10, le=10000),
+    current_user = Depends(get_current_user)
+):
     product = await db.product.find_unique(
-        where={"id": product_id, "userId": current_user.id},
-        include={"priceHistory": {"order_by": {"timestamp": "asc"}}}
+        where={"id": product_id, "userId": current_user.id}
     )
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return product
+    # Price history lives on the shared catalog entry
+    start, end = to_utc(start), to_utc(end)
+    history = []
+    if product.catalogId:
+        history = await db.pricehistory.find_many(
+            where=history_where(product.catalogId, start, end),
+            order={"timestamp": "asc"}
+        )
+    
+    # Expand runs, clip to the requested window and bound the payload size
+    points = clip_points(expand_runs(history), start, end)
+    
+    response = jsonable_encoder(product)
+    response["priceHistory"] = downsample(points, max_points)
+    return response
+
+@app.get("/api/products/{product_id}/rollups")
+async def get_product_rollups(
+    product_id: str,
+    resolution: str = Query("day"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    current_user = Depends(get_current_user)
+):
+    """Hourly, daily or weekly OHLC buckets and window statistics for long-range charts"""
+    if resolution not in ROLLUP_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(ROLLUP_RESOLUTIONS)}")
+    
+    product = await db.product.find_unique(
+        where={"id": product_id, "userId": current_user.id}
+    )
+    
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    rollups = []
+    if product.catalogId:
+        where = {"catalogId": product.catalogId, "resolution": resolution}
+        if start or end:
+            where["bucketStart"] = {}
+            if start:
+                where["bucketStart"]["gte"] = to_utc(start)
+            if end:
+                where["bucketStart"]["lte"] = to_utc(end)
+        rollups = await db.pricerollup.find_many(where=where, order={"bucketStart": "asc"})
+    
+    return {"resolution": resolution, "rollups": rollups, "stats": summarize(rollups)}
 
 @app.get("/api/alerts")
-async def get_alerts(current_user = Depends(get_current_user)):
+async def get_alerts(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, pattern="^(full|slim)$"),
+    current_user = Depends(get_current_user)
+):
+    slim = fields == "slim"
     alerts = await db.alert.find_many(
-        where={"userId": current_user.id},
-        include={"product": True}
+        where=page_where({"userId": current_user.id}, cursor),
+        order=PAGE_ORDER,
+        take=limit + 1 if limit else None,
+        include=None if slim else {"product": True}
     )
-    return {"alerts": alerts}
+    alerts, next_cursor = split_page(alerts, limit)
+    
+    if slim:
+        return {"alerts": project(alerts, SLIM_ALERT_FIELDS), "next_cursor": next_cursor}
+    return {"alerts": alerts, "next_cursor": next_cursor}
 
 @app.post("/api/alerts")
 async def create_alert(alert: AlertCreate, current_user = Depends(get_current_user)):
@@ -462,13 +628,17 @@ async def create_alert(alert: AlertCreate, current_user = Depends(get_current_us
             "targetPrice": alert.target_price,
             "email": alert.email,
             "userId": current_user.id,
-            "productId": alert.product_id
+            "productId": alert.product_id,
+            "catalogId": product.catalogId
         }
     )
     
     # Check if current price meets target
     if product.currentPrice <= alert.target_price:
-        await send_price_alert(alert.email, product.name, product.currentPrice, product.url)
+        await enqueue_email(
+            db, "price_alert", alert.email,
+            {"product_name": product.name, "price": product.currentPrice, "url": product.url}
+        )
         await db.alert.delete(where={"id": new_alert.id})
         return {"message": "Alert triggered immediately!"}
     
@@ -509,104 +679,123 @@ async def toggle_tracking(product_id: str, tracking_data: dict, current_user = D
     
     return {"message": "Tracking status updated"}
 
-async def send_price_alert(email: str, product_name: str, price: float, url: str):
-    """Send price alert email using Gmail API"""
-    try:
-        success = send_price_alert_email(email, product_name, price, url)
-        if success:
-            print(f"Alert email sent to {email}")
-        else:
-            print(f"Failed to send email to {email}")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-
-def scheduled_price_check():
-    """Check prices for all products and send alerts - runs in background thread"""
-    import asyncio
-    
-    async def async_price_check():
-        # Create new database connection for scheduler
-        scheduler_db = Prisma()
+async def scheduled_price_check():
+    """Check prices for all products and send alerts"""
+    with tracer.start_as_current_span("price_check.cycle") as span:
         try:
-            await scheduler_db.connect()
+            await database.ensure_connected()
             
-            products = await scheduler_db.product.find_many(include={"alerts": True})
+            # Each shared catalog product is scraped once, however many users track it
+            with tracer.start_as_current_span("price_check.load"):
+                if ADAPTIVE_SCHEDULE:
+                    due = await claim_due_products(db, CHECK_MAX_PER_TICK)
+                    products = await db.catalogproduct.find_many(where={"id": {"in": due}}) if due else []
+                else:
+                    products = await db.catalogproduct.find_many(
+                        where={"products": {"some": {}}}
+                    )
+            span.set_attribute("price_check.products", len(products))
             print(f"Checking prices for {len(products)} products...")
             
-            for product in products:
-                try:
-                    # Scrape current price
-                    scraped_data = await scraper.scrape_amazon(product.url)
-                    
+            async with PriceWriter(db) as writer:
+                async def process_product(product, scraped_data):
                     if scraped_data and scraped_data.get('price'):
                         new_price = scraped_data['price']
                         
-                        # Update product price
-                        await scheduler_db.product.update(
-                            where={"id": product.id},
-                            data={"currentPrice": new_price}
-                        )
-                        
-                        # Add to price history
-                        await scheduler_db.pricehistory.create(
-                            data={
-                                "price": new_price,
-                                "productId": product.id
-                            }
-                        )
-                        
-                        # Check alerts
-                        for alert in product.alerts:
-                            if new_price <= alert.targetPrice:
-                                await send_price_alert(alert.email, product.name, new_price, product.url)
-                                await scheduler_db.alert.delete(where={"id": alert.id})
-                        
+                        # Price, history and triggered alerts are settled in batches
+                        await writer.add(product.id, new_price)
                         print(f"Updated price for {product.name}: ${new_price}")
                     else:
                         print(f"Failed to scrape price for {product.name}")
-                        
-                except Exception as e:
-                    print(f"Error processing product {product.name}: {e}")
+                
+                # Scrape concurrently, persisting each product as its result arrives
+                await CheckEngine().run(products, process_product)
+            
+            # Digest mode: one email per user for everything that fired this cycle
+            if DIGEST_MODE:
+                with tracer.start_as_current_span("alerts.release_digests"):
+                    await release_digests(db)
                     
         except Exception as e:
+            span.record_exception(e)
             print(f"Scheduled price check error: {e}")
-        finally:
-            await scheduler_db.disconnect()
-    
-    # Run async function in new event loop
+
+async def enqueue_price_check():
+    """Queue mode: hand the cycle to scrape workers"""
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(async_price_check())
+        await database.ensure_connected()
+        due = await claim_due_products(db, CHECK_MAX_PER_TICK) if ADAPTIVE_SCHEDULE else None
+        queued = await enqueue_cycle(db, due)
+        print(f"Queued {queued} scrape jobs")
     except Exception as e:
-        print(f"Scheduler loop error: {e}")
-    finally:
-        loop.close()
+        print(f"Scrape job enqueue error: {e}")
+
+async def release_queued_digests():
+    """Queue mode: send digests once workers have drained the cycle's jobs"""
+    try:
+        if await outstanding_jobs(db) == 0:
+            await release_digests(db)
+            return True
+    except Exception as e:
+        print(f"Digest release error: {e}")
+    return False
+
+async def price_check_loop():
+    """Run the price check on the app's event loop, but only in the elected leader"""
+    # Adaptive scheduling checks for due products often; fixed sweeps everything each interval
+    interval = CHECK_TICK_SECONDS if ADAPTIVE_SCHEDULE else PRICE_CHECK_INTERVAL
+    next_run = asyncio.get_running_loop().time() + interval
+    digest_pending = False
+    while True:
+        await asyncio.sleep(LEADER_POLL_INTERVAL)
+        
+        # Followers keep polling so one of them takes over if the leader dies
+        if not await price_check_leader.acquire():
+            continue
+        
+        if digest_pending:
+            digest_pending = not await release_queued_digests()
+        
+        if asyncio.get_running_loop().time() >= next_run:
+            next_run = asyncio.get_running_loop().time() + interval
+            if PRICE_CHECK_MODE == "queue":
+                await enqueue_price_check()
+                digest_pending = DIGEST_MODE
+            else:
+                await scheduled_price_check()
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
-        # Ensure database connection
-        if not db.is_connected():
-            await db.connect()
-            
-        # Check database connection
-        await db.user.count()
+        # Check database connection (a dropped client reconnects in the background)
+        database_status = await database.health()
         
         # Check scheduler status
         global scheduler
-        scheduler_status = "running" if scheduler and scheduler.running else "stopped"
+        scheduler_status = "running" if scheduler and not scheduler.done() else "stopped"
         
         return {
             "status": "healthy",
             "database": "connected",
+            "database_pool": database_status,
             "scheduler": scheduler_status,
+            "scheduler_leader": price_check_leader.is_leader,
+            "price_check_mode": PRICE_CHECK_MODE,
+            "user_cache": user_cache.stats(),
+            "scrape_cache": scrape_cache.stats(),
+            "password_hashing": hash_pool_stats(),
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Service unhealthy: {str(e)}")
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/keep-alive")
 async def keep_alive():
     """Simple endpoint to keep server alive - for cron jobs"""
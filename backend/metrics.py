@@ -0,0 +1,127 @@
+"""
+Prometheus metrics for the API, the price check cycle and scrape workers.
+
+Everything here is a module-level prometheus_client collector, so recording
+is an in-memory counter/bucket increment with no I/O on the request path.
+The API serves them at GET /metrics; scrape_worker.py serves its own on
+SCRAPE_WORKER_METRICS_PORT. With several uvicorn workers set
+PROMETHEUS_MULTIPROC_DIR and /metrics aggregates all of them.
+
+Label values are kept bounded: routes are reported by their path template,
+scrape hosts are collapsed to amazon.* or "other", and DB queries by Prisma
+model and operation.
+"""
+import os
+import time
+from urllib.parse import urlparse
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+SCRAPE_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+CYCLE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+COUNT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+http_request_seconds = Histogram(
+    'pricepulse_http_request_duration_seconds', 'HTTP request latency by route template',
+    ['method', 'route', 'status']
+)
+scrape_seconds = Histogram(
+    'pricepulse_scrape_duration_seconds', 'Time from batch dispatch to each URL result',
+    ['host', 'outcome'], buckets=SCRAPE_BUCKETS
+)
+scraper_queued = Gauge(
+    'pricepulse_scraper_queued_calls', 'Scrape calls waiting for a ScrapyRunner executor thread',
+    multiprocess_mode='livesum'
+)
+scraper_busy = Gauge(
+    'pricepulse_scraper_busy_workers', 'Crawler worker slots currently running a batch',
+    multiprocess_mode='livesum'
+)
+check_cycle_seconds = Histogram(
+    'pricepulse_check_cycle_duration_seconds', 'Duration of one CheckEngine run (a cycle or a worker batch)',
+    buckets=CYCLE_BUCKETS
+)
+check_cycle_products = Histogram(
+    'pricepulse_check_cycle_products', 'Products checked per CheckEngine run', buckets=COUNT_BUCKETS
+)
+products_checked = Counter('pricepulse_products_checked_total', 'Products checked by outcome', ['outcome'])
+db_query_seconds = Histogram('pricepulse_db_query_duration_seconds', 'Prisma query latency', ['model', 'operation'])
+email_send_seconds = Histogram('pricepulse_email_send_duration_seconds', 'Latency of one transport send_many call', ['transport'])
+emails = Counter('pricepulse_emails_total', 'Outbound emails by kind and outcome', ['kind', 'outcome'])
+
+
+def host_label(url):
+    """Bounded host label: the amazon.* marketplace, or 'other'"""
+    host = (urlparse(url or '').hostname or '').lower()
+    host = host[4:] if host.startswith('www.') else host
+    return host if host.startswith('amazon.') else 'other'
+
+
+def scrape_outcome(item):
+    """Outcome label for a raw crawler worker result"""
+    if item is None:
+        return 'failed'
+    if item.get('_not_modified'):
+        return 'not_modified'
+    return 'ok' if item.get('price') else 'no_price'
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware timing each request under its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route on the shared scope
+            route = scope.get('route')
+            http_request_seconds.labels(
+                scope['method'], getattr(route, 'path', 'unmatched'), str(status)
+            ).observe(time.perf_counter() - started)
+
+
+def instrument_prisma(client_class):
+    """Time every query of a generated Prisma client class, transactions included"""
+    execute = getattr(client_class, '_execute', None)
+    if execute is None or getattr(execute, 'instrumented', False):
+        # Unknown client internals: skip the DB metrics rather than break queries
+        return
+
+    async def timed_execute(self, *, method, arguments, model=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await execute(self, method=method, arguments=arguments, model=model, **kwargs)
+        finally:
+            db_query_seconds.labels(
+                model.__name__ if model is not None else 'raw', method
+            ).observe(time.perf_counter() - started)
+
+    timed_execute.instrumented = True
+    client_class._execute = timed_execute
+
+
+def render_metrics():
+    """(body, content type) for the /metrics endpoint"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
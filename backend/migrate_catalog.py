@@ -0,0 +1,105 @@
+"""
+One-time migration of per-user products onto the shared catalog.
+
+Run once after `python -m prisma db push` has created the catalog tables:
+
+    python migrate_catalog.py
+
+Each product is canonicalized to marketplace + ASIN and linked to its
+CatalogProduct. The oldest subscription's price history becomes the shared
+series; the duplicate series of later subscribers are deleted. A URL with no
+ASIN in it (short links and the like) is resolved like track_product does, by
+scraping it and canonicalizing the page's final URL.
+
+The check cycle only visits catalog products, so a product left without a
+catalog entry would silently stop being checked. Any product that still can't
+be resolved is listed and the migration exits with status 1; fix those URLs
+(or delete the products) and run it again, already linked products are skipped.
+"""
+import asyncio
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import prisma
+
+from catalog import canonicalize_url, catalog_where
+from scraper import scraper
+
+
+async def resolve_key(product):
+    """(marketplace, asin, canonical_url) for a legacy product, scraping its URL when it has no ASIN"""
+    key = canonicalize_url(product.url)
+    if key:
+        return key
+    scraped = await scraper.scrape_amazon(product.url)
+    return canonicalize_url(scraped.get('url')) if scraped else None
+
+
+async def link_products(db, resolve=None):
+    """Link every product without a catalog entry; returns the products that could not be resolved"""
+    resolve = resolve or resolve_key
+    products = await db.product.find_many(
+        where={"catalogId": None},
+        order={"createdAt": "asc"}
+    )
+    print(f"Migrating {len(products)} products onto the shared catalog...")
+
+    unresolved = []
+    for product in products:
+        key = await resolve(product)
+        if not key:
+            unresolved.append(product)
+            continue
+
+        marketplace, asin, url = key
+        catalog = await db.catalogproduct.find_unique(where=catalog_where(marketplace, asin))
+
+        if catalog:
+            # Already covered by an older subscription's series
+            await db.pricehistory.delete_many(where={"productId": product.id})
+        else:
+            catalog = await db.catalogproduct.create(
+                data={
+                    "marketplace": marketplace,
+                    "asin": asin,
+                    "url": url,
+                    "name": product.name,
+                    "image": product.image,
+                    "currentPrice": product.currentPrice
+                }
+            )
+            await db.pricehistory.update_many(
+                where={"productId": product.id},
+                data={"catalogId": catalog.id, "productId": None}
+            )
+
+        await db.product.update(where={"id": product.id}, data={"catalogId": catalog.id})
+        await db.alert.update_many(where={"productId": product.id}, data={"catalogId": catalog.id})
+
+    catalog_count = await db.catalogproduct.count()
+    print(f"Done: {len(products) - len(unresolved)} products linked to {catalog_count} catalog entries")
+    return unresolved
+
+
+async def migrate():
+    db = prisma.Prisma()
+    await db.connect()
+    try:
+        unresolved = await link_products(db)
+    finally:
+        await db.disconnect()
+        scraper.shutdown()
+
+    if unresolved:
+        for product in unresolved:
+            print(f"Unresolved product {product.id} (user {product.userId}): no ASIN for {product.url}")
+        raise SystemExit(
+            f"{len(unresolved)} products could not be linked to the catalog and would never be checked; "
+            "fix or delete them and run the migration again"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
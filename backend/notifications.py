@@ -0,0 +1,276 @@
+"""
+Durable outbound email queue backed by Postgres.
+
+Endpoints and the check cycle enqueue rows into outbound_emails and return
+immediately. NotificationWorker tasks on the app's event loop claim due rows
+with FOR UPDATE SKIP LOCKED, render and send them through a transport off the
+event loop, and either mark them sent, reschedule them with exponential
+backoff, or dead-letter them after NOTIFY_MAX_ATTEMPTS.
+
+NOTIFY_TRANSPORT=stub swaps Gmail for StubTransport, which records messages
+in memory instead of sending them (for tests and local development).
+
+With ALERT_DIGEST enabled, alerts triggered during a check cycle are held and
+released at the end of the cycle as one digest email per recipient.
+"""
+import asyncio
+import json
+import os
+import random
+from collections import defaultdict
+from datetime import datetime
+
+from prisma import Json
+
+from db_utils import UTC_NOW
+from email_service import render_otp, render_price_alert, render_price_alert_digest, send_many_emails
+from metrics import email_send_seconds, emails
+from tracing import tracer
+
+DIGEST_MODE = os.getenv('ALERT_DIGEST', 'false').lower() in ('1', 'true', 'yes')
+
+RENDERERS = {
+    "otp": lambda payload: render_otp(payload["otp"]),
+    "price_alert": lambda payload: render_price_alert(payload["product_name"], payload["price"], payload["url"]),
+    "price_alert_digest": lambda payload: render_price_alert_digest(payload["items"]),
+}
+
+
+class GmailTransport:
+    """Sends rendered messages through the shared Gmail client in batch requests"""
+
+    def send_many(self, messages):
+        return send_many_emails(messages)
+
+
+class StubTransport:
+    """Records messages instead of sending them; set `fail` to simulate outages"""
+
+    def __init__(self, fail=False):
+        self.sent = []
+        self.fail = fail
+
+    def send_many(self, messages):
+        if self.fail:
+            return [False] * len(messages)
+        self.sent.extend(messages)
+        for to_email, subject, *_ in messages:
+            print(f"[stub email] to={to_email} subject={subject}")
+        return [True] * len(messages)
+
+
+def get_transport():
+    if os.getenv('NOTIFY_TRANSPORT', 'gmail') == 'stub':
+        return StubTransport()
+    return GmailTransport()
+
+
+async def enqueue_email(db, kind: str, recipient: str, payload: dict):
+    """Queue one email for delivery"""
+    await enqueue_emails(db, [(kind, recipient, payload)])
+
+
+def alert_emails(triggered):
+    """Outbound email rows for a list of TriggeredAlert"""
+    return [
+        ("price_alert", t.email, {"product_name": t.name, "price": t.price, "url": t.url})
+        for t in triggered
+    ]
+
+
+async def enqueue_emails(db, emails, hold=False):
+    """Queue many (kind, recipient, payload) emails with one insert; held rows wait for release_digests"""
+    if not emails:
+        return
+    await db.outboundemail.create_many(
+        data=[
+            {"kind": kind, "recipient": recipient, "payload": Json(payload), "status": "held" if hold else "pending"}
+            for kind, recipient, payload in emails
+        ]
+    )
+    if not hold:
+        notifier.wake()
+
+
+async def enqueue_alert_emails(db, triggered):
+    """Queue emails for triggered alerts, held for the end-of-cycle digest in digest mode"""
+    await enqueue_emails(db, alert_emails(triggered), hold=DIGEST_MODE)
+
+
+async def release_digests(db):
+    """Turn held alert emails into one email per recipient, including leftovers of a crashed cycle"""
+    async with db.tx() as tx:
+        held = await tx.outboundemail.find_many(
+            where={"status": "held"},
+            order={"createdAt": "asc"}
+        )
+        if not held:
+            return 0
+
+        by_recipient = defaultdict(list)
+        for email in held:
+            by_recipient[email.recipient].append(email.payload)
+
+        await enqueue_emails(tx, [
+            ("price_alert", recipient, items[0]) if len(items) == 1
+            else ("price_alert_digest", recipient, {"items": items})
+            for recipient, items in by_recipient.items()
+        ])
+        await tx.outboundemail.delete_many(where={"id": {"in": [email.id for email in held]}})
+
+    print(f"Released {len(held)} held alerts as {len(by_recipient)} emails")
+    return len(by_recipient)
+
+
+class NotificationWorker:
+    def __init__(self, concurrency=None, batch_size=None, max_attempts=None,
+                 base_delay=None, lease_seconds=None, poll_interval=None):
+        self.concurrency = concurrency or int(os.getenv('NOTIFY_CONCURRENCY', 2))
+        self.batch_size = batch_size or int(os.getenv('NOTIFY_BATCH_SIZE', 50))
+        self.max_attempts = max_attempts or int(os.getenv('NOTIFY_MAX_ATTEMPTS', 6))
+        self.base_delay = base_delay or float(os.getenv('NOTIFY_BASE_DELAY_SECONDS', 30))
+        self.lease_seconds = lease_seconds or int(os.getenv('NOTIFY_LEASE_SECONDS', 120))
+        self.poll_interval = poll_interval or float(os.getenv('NOTIFY_POLL_SECONDS', 5))
+
+        self.db = None
+        self.transport = None
+        self.tasks = []
+        self.wakeup = None
+        self.loop = None
+
+    def start(self, db, transport=None):
+        """Start worker tasks on the running event loop"""
+        self.db = db
+        self.transport = transport or get_transport()
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        print(f"Notification workers started ({self.concurrency} tasks, {type(self.transport).__name__})")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def wake(self):
+        """Nudge idle workers after an enqueue; safe to call from any thread or loop"""
+        if not self.loop or not self.wakeup:
+            return
+        try:
+            if asyncio.get_running_loop() is self.loop:
+                self.wakeup.set()
+                return
+        except RuntimeError:
+            pass
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                sent = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Notification worker error: {e}")
+                sent = 0
+
+            if not sent:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+
+    async def claim(self):
+        """Lease a batch of due emails; expired leases of crashed workers are reclaimed"""
+        return await self.db.query_raw(
+            f'''
+            UPDATE outbound_emails
+            SET status = 'sending', attempts = attempts + 1,
+                "nextAttemptAt" = {UTC_NOW} + make_interval(secs => $2::double precision)
+            WHERE id IN (
+                SELECT id FROM outbound_emails
+                WHERE status IN ('pending', 'sending') AND "nextAttemptAt" <= {UTC_NOW}
+                ORDER BY "nextAttemptAt"
+                LIMIT $1::int
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, kind, recipient, payload, attempts
+            ''',
+            self.batch_size, self.lease_seconds
+        )
+
+    async def process_batch(self):
+        """Send one claimed batch, returns the number of emails handled"""
+        rows = await self.claim()
+        if not rows:
+            return 0
+
+        # Only batches that found work are traced, not every idle poll
+        with tracer.start_as_current_span('email.batch', attributes={'email.claimed': len(rows)}):
+            return await self.deliver(rows)
+
+    async def deliver(self, rows):
+        """Render, send and settle a claimed batch"""
+        sendable = []
+        messages = []
+        for row in rows:
+            try:
+                payload = row['payload']
+                if isinstance(payload, str):
+                    payload = json.loads(payload)
+                messages.append((row['recipient'], *RENDERERS[row['kind']](payload)))
+                sendable.append(row)
+            except Exception as e:
+                # A message that can't be rendered will never succeed
+                await self.dead_letter(row, f"Render failed: {e}")
+
+        results = await self.send(messages) if messages else []
+
+        sent_ids = [row['id'] for row, ok in zip(sendable, results) if ok]
+        if sent_ids:
+            await self.db.outboundemail.update_many(
+                where={"id": {"in": sent_ids}},
+                data={"status": "sent", "sentAt": datetime.utcnow(), "lastError": None}
+            )
+
+        for row, ok in zip(sendable, results):
+            emails.labels(row['kind'], 'sent' if ok else 'failed').inc()
+            if not ok:
+                await self.retry_or_dead_letter(row)
+
+        return len(rows)
+
+    async def send(self, messages):
+        """Hand a batch to the transport off the event loop, timing the call"""
+        transport = type(self.transport).__name__
+        with tracer.start_as_current_span('email.send', attributes={'email.transport': transport, 'email.messages': len(messages)}):
+            with email_send_seconds.labels(transport).time():
+                return await asyncio.to_thread(self.transport.send_many, messages)
+
+    async def dead_letter(self, row, error):
+        emails.labels(row['kind'], 'dead').inc()
+        print(f"Dead-lettering {row['kind']} email to {row['recipient']}: {error}")
+        await self.db.outboundemail.update(
+            where={"id": row['id']},
+            data={"status": "dead", "lastError": error}
+        )
+
+    async def retry_or_dead_letter(self, row):
+        if row['attempts'] >= self.max_attempts:
+            await self.dead_letter(row, f"Delivery failed after {row['attempts']} attempts")
+            return
+
+        # Exponential backoff with jitter: base, 2x base, 4x base, ...
+        delay = self.base_delay * 2 ** (row['attempts'] - 1) * random.uniform(0.8, 1.2)
+        await self.db.execute_raw(
+            f'''UPDATE outbound_emails
+            SET status = 'pending', "lastError" = 'Delivery failed',
+                "nextAttemptAt" = {UTC_NOW} + make_interval(secs => $2::double precision)
+            WHERE id = $1''',
+            row['id'], delay
+        )
+
+
+notifier = NotificationWorker()
@@ -0,0 +1,57 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Rows are ordered by (createdAt desc, id desc). The cursor is an opaque token
+encoding the last row of a page, so each page is one indexed range scan no
+matter how deep the client has paged.
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+
+PAGE_ORDER = [{"createdAt": "desc"}, {"id": "desc"}]
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(row) -> str:
+    payload = json.dumps([row.createdAt.isoformat(), row.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), row_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_where(where: dict, cursor: str = None) -> dict:
+    """Add the keyset condition for rows after `cursor` to a Prisma filter"""
+    if not cursor:
+        return where
+
+    created_at, row_id = decode_cursor(cursor)
+    return {
+        **where,
+        "OR": [
+            {"createdAt": {"lt": created_at}},
+            {"createdAt": {"equals": created_at}, "id": {"lt": row_id}}
+        ]
+    }
+
+
+def split_page(rows, limit):
+    """Trim the extra look-ahead row and return (page, next_cursor)"""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1])
+
+
+def project(rows, fields):
+    """Slim field projection for list responses"""
+    return [{field: getattr(row, field) for field in fields} for row in rows]
@@ -0,0 +1,124 @@
+"""
+Bounded-concurrency engine for the scheduled price check cycle.
+
+Scrapes run concurrently under a global in-flight limit, with a per-host
+concurrency budget and token bucket (amazon.in and amazon.com are limited
+independently) plus random jitter. Each product's result is handed to the
+caller's handler as soon as it arrives.
+"""
+import asyncio
+import os
+import random
+import time
+from urllib.parse import urlparse
+
+from scraper import scraper
+from metrics import check_cycle_products, check_cycle_seconds, products_checked
+from tracing import tracer
+
+
+def parse_host_rates(value):
+    """Parse "amazon.in=0.5,amazon.com=1" into {host: requests per second}"""
+    rates = {}
+    for entry in (value or '').split(','):
+        if '=' not in entry:
+            continue
+        host, rate = entry.split('=', 1)
+        try:
+            rates[host.strip().lower()] = float(rate)
+        except ValueError:
+            print(f"Ignoring invalid host rate: {entry}")
+    return rates
+
+
+def host_key(url):
+    """Normalize a product URL to the host its rate budget is tracked under"""
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class TokenBucket:
+    """Async token bucket allowing `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CheckEngine:
+    def __init__(self, scrape=None, concurrency=None, host_concurrency=None,
+                 host_rates=None, default_rate=None, burst=None, jitter=None):
+        self.scrape = scrape or scraper.scrape_amazon
+        self.concurrency = concurrency or int(os.getenv('CHECK_CONCURRENCY', scraper.pool_size))
+        self.host_concurrency = host_concurrency or int(os.getenv('CHECK_HOST_CONCURRENCY', 2))
+        self.host_rates = host_rates if host_rates is not None else parse_host_rates(os.getenv('CHECK_HOST_RATES'))
+        self.default_rate = default_rate or float(os.getenv('CHECK_HOST_RATE', 1.0))
+        self.burst = burst or float(os.getenv('CHECK_HOST_BURST', 2))
+        self.jitter = jitter if jitter is not None else float(os.getenv('CHECK_JITTER_SECONDS', 1.0))
+
+        self.in_flight = asyncio.Semaphore(self.concurrency)
+        self.host_limits = {}
+        self.buckets = {}
+
+    def _host_limit(self, host):
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.host_concurrency)
+        return self.host_limits[host]
+
+    def _bucket(self, host):
+        if host not in self.buckets:
+            rate = self.host_rates.get(host, self.default_rate)
+            self.buckets[host] = TokenBucket(rate, self.burst)
+        return self.buckets[host]
+
+    async def _check(self, product, handler):
+        host = host_key(product.url)
+
+        with tracer.start_as_current_span('check.product', attributes={'catalog.id': product.id, 'server.address': host}):
+            if self.jitter:
+                await asyncio.sleep(random.uniform(0, self.jitter))
+
+            # Host budget and token first: a throttled host waits without holding a global slot
+            async with self._host_limit(host):
+                with tracer.start_as_current_span('check.throttle'):
+                    await self._bucket(host).acquire()
+                async with self.in_flight:
+                    scraped_data = await self.scrape(product.url)
+
+            products_checked.labels('scraped' if scraped_data and scraped_data.get('price') else 'failed').inc()
+            # Persist outside the scrape budget so slow writes don't hold scrape slots
+            with tracer.start_as_current_span('check.persist'):
+                await handler(product, scraped_data)
+
+    async def run(self, products, handler):
+        """Scrape every product concurrently and await `handler(product, scraped_data)` for each"""
+        started = time.monotonic()
+        tasks = [asyncio.create_task(self._check(product, handler)) for product in products]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        for product, result in zip(products, results):
+            if isinstance(result, Exception):
+                products_checked.labels('error').inc()
+                print(f"Error processing product {product.name}: {result}")
+
+        elapsed = time.monotonic() - started
+        check_cycle_seconds.observe(elapsed)
+        check_cycle_products.observe(len(products))
+        print(f"Checked {len(products)} products in {elapsed:.1f}s")
+        return results
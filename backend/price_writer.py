@@ -0,0 +1,120 @@
+"""
+Batched, transactional write path for the price check cycle.
+
+Results are buffered and flushed in one transaction per batch: a bulk write
+to price_history and its rollups, one multi-row UPDATE for catalog and
+subscription prices, and one set-based claim of the alerts the new prices
+trigger. Their emails are queued in the same transaction, so an alert is
+deleted if and only if its notification is durably enqueued (or held for the
+end-of-cycle digest).
+
+A failed flush puts its rows back in the buffer for the next one, and
+`committed` records which catalog products have actually been written.
+"""
+import asyncio
+import os
+import time
+from alert_matcher import claim_triggered_alerts
+from check_policy import ADAPTIVE_SCHEDULE, schedule_next_checks
+from db_utils import UTC_NOW, values_list
+from history import append_history
+from notifications import enqueue_alert_emails
+from rollups import update_rollups
+from tracing import tracer
+
+
+class PriceWriter:
+    def __init__(self, db, batch_size=None, flush_interval=None):
+        self.db = db
+        self.batch_size = batch_size or int(os.getenv('PRICE_WRITE_BATCH_SIZE', 200))
+        self.flush_interval = flush_interval or float(os.getenv('PRICE_WRITE_FLUSH_SECONDS', 5))
+
+        self.prices = {}
+        self.lock = asyncio.Lock()
+        self.last_flush = time.monotonic()
+        self.flusher = None
+        self.committed = set()
+
+    async def __aenter__(self):
+        self.flusher = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # Under the lock the flusher can't be inside a transaction, so cancelling it loses nothing
+        async with self.lock:
+            self.flusher.cancel()
+        await asyncio.gather(self.flusher, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self.prices and time.monotonic() - self.last_flush >= self.flush_interval:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print(f"Price batch flush error, retrying with the next batch: {e}")
+
+    async def add(self, catalog_id, price):
+        """Queue a new price for a catalog product"""
+        self.prices[catalog_id] = price
+
+        if len(self.prices) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Write everything buffered so far in a single transaction"""
+        async with self.lock:
+            prices, self.prices = self.prices, {}
+            self.last_flush = time.monotonic()
+
+            if not prices:
+                return []
+
+            try:
+                triggered = await self.write(prices)
+            except BaseException:
+                # Keep the batch for the next flush; prices added since are newer and win
+                self.prices = {**prices, **self.prices}
+                raise
+            self.committed.update(prices)
+
+            print(f"Flushed {len(prices)} price updates and {len(triggered)} triggered alerts")
+
+        return triggered
+
+    async def write(self, prices):
+        """One transaction for a batch of {catalog_id: price}; returns the triggered alerts"""
+        rows = list(prices.items())
+        values, params = values_list(rows, ('', '::double precision'))
+
+        with tracer.start_as_current_span('price_writer.flush', attributes={'price_writer.rows': len(rows)}):
+            async with self.db.tx() as tx:
+                await append_history(tx, rows)
+                await update_rollups(tx, rows)
+                await tx.execute_raw(
+                    f'''
+                    UPDATE catalog_products AS c
+                    SET "currentPrice" = v.price, "lastCheckedAt" = {UTC_NOW}, "updatedAt" = {UTC_NOW}
+                    FROM (VALUES {values}) AS v(id, price)
+                    WHERE c.id = v.id
+                    ''',
+                    *params
+                )
+                await tx.execute_raw(
+                    f'''
+                    UPDATE products AS p
+                    SET "currentPrice" = v.price, "updatedAt" = {UTC_NOW}
+                    FROM (VALUES {values}) AS v(id, price)
+                    WHERE p."catalogId" = v.id
+                    ''',
+                    *params
+                )
+                if ADAPTIVE_SCHEDULE:
+                    await schedule_next_checks(tx, list(prices))
+                with tracer.start_as_current_span('alerts.claim') as span:
+                    triggered = await claim_triggered_alerts(tx, rows)
+                    span.set_attribute('alerts.triggered', len(triggered))
+                    await enqueue_alert_emails(tx, triggered)
+
+        return triggered
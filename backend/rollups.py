@@ -0,0 +1,86 @@
+"""
+Hourly, daily and weekly OHLC rollups of catalog prices.
+
+Rollups are upserted on the write path as prices arrive, so long-range charts
+and statistics read one row per bucket instead of scanning raw history.
+backfill_rollups.py rebuilds them from existing history.
+"""
+from db_utils import UTC_NOW, values_list
+
+ROLLUP_RESOLUTIONS = ('hour', 'day', 'week')
+
+
+async def update_rollups(db, prices):
+    """Fold a list of (catalog_id, price) observations into the current bucket of every resolution"""
+    if not prices:
+        return
+
+    values, params = values_list(prices, ('', '::double precision'))
+    resolutions = ', '.join(f"('{resolution}')" for resolution in ROLLUP_RESOLUTIONS)
+
+    await db.execute_raw(
+        f'''
+        INSERT INTO price_rollups
+            ("catalogId", resolution, "bucketStart", "openPrice", "closePrice", "minPrice", "maxPrice", samples)
+        SELECT v.id, r.resolution, date_trunc(r.resolution, {UTC_NOW}), v.price, v.price, v.price, v.price, 1
+        FROM (VALUES {values}) AS v(id, price)
+        CROSS JOIN (VALUES {resolutions}) AS r(resolution)
+        ON CONFLICT ("catalogId", resolution, "bucketStart") DO UPDATE SET
+            "closePrice" = EXCLUDED."closePrice",
+            "minPrice" = LEAST(price_rollups."minPrice", EXCLUDED."minPrice"),
+            "maxPrice" = GREATEST(price_rollups."maxPrice", EXCLUDED."maxPrice"),
+            samples = price_rollups.samples + 1
+        ''',
+        *params
+    )
+
+
+async def backfill_rollups(db, resolution):
+    """Rebuild all rollups of one resolution from stored price history, returns rows written"""
+    if resolution not in ROLLUP_RESOLUTIONS:
+        raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+    # Run-length rows cover every bucket between their first and last observation
+    return await db.execute_raw(
+        f'''
+        WITH spans AS (
+            SELECT ph."catalogId", ph.price, ph.timestamp, bucket
+            FROM price_history AS ph
+            CROSS JOIN LATERAL generate_series(
+                date_trunc('{resolution}', ph.timestamp),
+                date_trunc('{resolution}', COALESCE(ph."lastSeenAt", ph.timestamp)),
+                INTERVAL '1 {resolution}'
+            ) AS bucket
+            WHERE ph."catalogId" IS NOT NULL
+        )
+        INSERT INTO price_rollups
+            ("catalogId", resolution, "bucketStart", "openPrice", "closePrice", "minPrice", "maxPrice", samples)
+        SELECT "catalogId", '{resolution}', bucket,
+               (array_agg(price ORDER BY timestamp))[1],
+               (array_agg(price ORDER BY timestamp DESC))[1],
+               MIN(price), MAX(price), COUNT(*)
+        FROM spans
+        GROUP BY "catalogId", bucket
+        ON CONFLICT ("catalogId", resolution, "bucketStart") DO UPDATE SET
+            "openPrice" = EXCLUDED."openPrice",
+            "closePrice" = EXCLUDED."closePrice",
+            "minPrice" = EXCLUDED."minPrice",
+            "maxPrice" = EXCLUDED."maxPrice",
+            samples = EXCLUDED.samples
+        '''
+    )
+
+
+def summarize(rollups):
+    """Window statistics computed from rollup rows instead of raw history"""
+    if not rollups:
+        return None
+
+    samples = sum(r.samples for r in rollups)
+    return {
+        "open": rollups[0].openPrice,
+        "close": rollups[-1].closePrice,
+        "min": min(r.minPrice for r in rollups),
+        "max": max(r.maxPrice for r in rollups),
+        "samples": samples
+    }
@@ -0,0 +1,109 @@
+"""
+Per-process cache of scrape results and their HTTP validators.
+
+ScrapyRunner consults it before crawling:
+
+- a result younger than SCRAPE_CACHE_TTL_SECONDS is served without touching
+  the network (e.g. two users tracking the same URL moments apart)
+- older entries are revalidated: the spider sends If-None-Match /
+  If-Modified-Since and, on a 200, hashes the raw price region of the page
+  before parsing. A 304 or an unchanged region hash comes back as a
+  "not modified" marker and the cached item is reused without a parse.
+- after SCRAPE_CACHE_MAX_REVALIDATIONS "not modified" answers in a row the
+  validators are withheld, so the next check is a full fetch and parse. An
+  etag or region hash can stay put while the price changes (a stale CDN
+  copy, a price rendered outside the hashed region), and this bounds how
+  long such a result can be served.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Keys the spider adds to items for the cache; stripped before results are returned
+META_KEYS = ('_not_modified', '_etag', '_last_modified', '_region_hash')
+
+
+class ScrapeCache:
+    def __init__(self, max_size=None, ttl=None, max_revalidations=None):
+        self.max_size = max_size or int(os.getenv('SCRAPE_CACHE_SIZE', 5000))
+        self.ttl = ttl if ttl is not None else float(os.getenv('SCRAPE_CACHE_TTL_SECONDS', 300))
+        self.max_revalidations = (
+            max_revalidations if max_revalidations is not None
+            else int(os.getenv('SCRAPE_CACHE_MAX_REVALIDATIONS', 12))
+        )
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+
+    def fresh(self, url):
+        """Cached item if it is recent enough to skip the network entirely"""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry and time.monotonic() - entry['fetched_at'] < self.ttl:
+                self.entries.move_to_end(url)
+                self.hits += 1
+                return dict(entry['item'])
+        return None
+
+    def validators(self, url):
+        """What the spider needs for a conditional request, or None to force a full fetch"""
+        with self.lock:
+            entry = self.entries.get(url)
+            if not entry or entry['revalidations'] >= self.max_revalidations:
+                return None
+            return {
+                'etag': entry['etag'],
+                'last_modified': entry['last_modified'],
+                'region_hash': entry['region_hash']
+            }
+
+    def resolve(self, url, item):
+        """Turn a worker result into a full item, updating the cache along the way"""
+        if item is None:
+            return None
+
+        with self.lock:
+            if item.get('_not_modified'):
+                entry = self.entries.get(url)
+                if not entry:
+                    # Evicted while the request was in flight; treat as a failed scrape
+                    return None
+                entry['fetched_at'] = time.monotonic()
+                entry['revalidations'] += 1
+                entry['etag'] = item.get('_etag') or entry['etag']
+                entry['last_modified'] = item.get('_last_modified') or entry['last_modified']
+                self.entries.move_to_end(url)
+                self.revalidated += 1
+                return dict(entry['item'])
+
+            meta = {key: item.pop(key, None) for key in META_KEYS}
+            self.fetched += 1
+            if item.get('price'):
+                self.entries[url] = {
+                    'item': dict(item),
+                    'etag': meta['_etag'],
+                    'last_modified': meta['_last_modified'],
+                    'region_hash': meta['_region_hash'],
+                    'fetched_at': time.monotonic(),
+                    'revalidations': 0
+                }
+                self.entries.move_to_end(url)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+            return item
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "ttl_seconds": self.ttl,
+            "max_revalidations": self.max_revalidations,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "fetched": self.fetched
+        }
+
+
+scrape_cache = ScrapeCache()
@@ -0,0 +1,101 @@
+"""
+Postgres-backed scrape job queue for horizontally scaled price checks.
+
+The leader's cycle only enqueues: every subscribed catalog product gets one
+row in scrape_jobs, reused across cycles. Any number of scrape_worker.py
+processes claim due jobs with FOR UPDATE SKIP LOCKED, so they never block on
+or double-claim each other's rows. A claim makes the job invisible for
+SCRAPE_JOB_VISIBILITY_SECONDS; a worker that dies mid-batch simply lets the
+lease expire and the job is picked up again. Failures back off exponentially
+and are dead-lettered after SCRAPE_JOB_MAX_ATTEMPTS.
+"""
+import os
+import random
+
+from db_utils import UTC_NOW, values_list
+
+VISIBILITY_SECONDS = int(os.getenv('SCRAPE_JOB_VISIBILITY_SECONDS', 300))
+MAX_ATTEMPTS = int(os.getenv('SCRAPE_JOB_MAX_ATTEMPTS', 3))
+RETRY_BASE_DELAY = float(os.getenv('SCRAPE_JOB_RETRY_DELAY_SECONDS', 60))
+
+
+async def enqueue_cycle(db, catalog_ids=None):
+    """Queue a scrape of every subscribed catalog product, or just `catalog_ids`; jobs still in flight are left alone"""
+    if catalog_ids is not None and not catalog_ids:
+        return 0
+
+    if catalog_ids is None:
+        selection, params = 'EXISTS (SELECT 1 FROM products AS p WHERE p."catalogId" = c.id)', []
+    else:
+        values, params = values_list([(catalog_id,) for catalog_id in catalog_ids], ('',))
+        selection = f'c.id IN (VALUES {values})'
+
+    return await db.execute_raw(
+        f'''
+        INSERT INTO scrape_jobs (id, "catalogId", status, attempts, "visibleAt", "createdAt", "updatedAt")
+        SELECT 'sj' || c.id, c.id, 'pending', 0, {UTC_NOW}, {UTC_NOW}, {UTC_NOW}
+        FROM catalog_products AS c
+        WHERE {selection}
+        ON CONFLICT ("catalogId") DO UPDATE
+        SET status = 'pending', attempts = 0, "visibleAt" = {UTC_NOW},
+            "lockedBy" = NULL, "lastError" = NULL, "updatedAt" = {UTC_NOW}
+        WHERE scrape_jobs.status IN ('done', 'dead')
+        ''',
+        *params
+    )
+
+
+async def claim_jobs(db, worker_id, limit, visibility=None):
+    """Lease up to `limit` due jobs; expired leases of crashed workers are reclaimed"""
+    return await db.query_raw(
+        f'''
+        UPDATE scrape_jobs
+        SET status = 'running', attempts = attempts + 1, "lockedBy" = $2,
+            "visibleAt" = {UTC_NOW} + make_interval(secs => $3::double precision),
+            "updatedAt" = {UTC_NOW}
+        WHERE id IN (
+            SELECT id FROM scrape_jobs
+            WHERE status IN ('pending', 'running') AND "visibleAt" <= {UTC_NOW}
+            ORDER BY "visibleAt"
+            LIMIT $1::int
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, "catalogId", attempts
+        ''',
+        limit, worker_id, visibility or VISIBILITY_SECONDS
+    )
+
+
+async def ack_jobs(db, worker_id, job_ids):
+    """Mark jobs done; a job whose lease was lost to another worker is left to that worker"""
+    if not job_ids:
+        return 0
+    return await db.scrapejob.update_many(
+        where={"id": {"in": job_ids}, "lockedBy": worker_id, "status": "running"},
+        data={"status": "done", "lockedBy": None, "lastError": None}
+    )
+
+
+async def fail_job(db, worker_id, job, error):
+    """Reschedule a failed job with exponential backoff, or dead-letter it"""
+    if job['attempts'] >= MAX_ATTEMPTS:
+        print(f"Dead-lettering scrape job {job['id']} after {job['attempts']} attempts: {error}")
+        status, delay = 'dead', 0
+    else:
+        status = 'pending'
+        delay = RETRY_BASE_DELAY * 2 ** (job['attempts'] - 1) * random.uniform(0.8, 1.2)
+
+    await db.execute_raw(
+        f'''
+        UPDATE scrape_jobs
+        SET status = $3, "lastError" = $4, "lockedBy" = NULL, "updatedAt" = {UTC_NOW},
+            "visibleAt" = {UTC_NOW} + make_interval(secs => $5::double precision)
+        WHERE id = $1 AND "lockedBy" = $2
+        ''',
+        job['id'], worker_id, status, str(error)[:500], delay
+    )
+
+
+async def outstanding_jobs(db):
+    """Jobs not yet finished in the current cycle"""
+    return await db.scrapejob.count(where={"status": {"in": ["pending", "running"]}})
@@ -0,0 +1,122 @@
+"""
+Stateless scrape worker for the Postgres job queue.
+
+Run as many as needed, on any node that can reach the database:
+
+    python scrape_worker.py [--batch 20] [--once]
+
+Each worker claims a batch of due jobs, scrapes them through the local
+crawler pool with the usual per-host limits, writes prices (history,
+rollups, alerts) through PriceWriter, and acks the jobs once the batch is
+committed. Set PRICE_CHECK_MODE=queue on the API so its leader only
+enqueues jobs instead of scraping in-process.
+"""
+import argparse
+import asyncio
+import os
+import socket
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from prometheus_client import start_http_server
+
+from database import database
+from price_check import CheckEngine
+from price_writer import PriceWriter
+from scrape_queue import ack_jobs, claim_jobs, fail_job
+from scraper import scraper
+from tracing import configure_tracing, shutdown_tracing, tracer
+
+BATCH_SIZE = int(os.getenv('SCRAPE_WORKER_BATCH_SIZE', 20))
+IDLE_SECONDS = float(os.getenv('SCRAPE_WORKER_IDLE_SECONDS', 10))
+# Prometheus scrape target for this worker's scrape, cycle and DB metrics (0 = off)
+METRICS_PORT = int(os.getenv('SCRAPE_WORKER_METRICS_PORT', 0))
+
+
+async def process_batch(db, worker_id, batch_size):
+    """Claim, scrape and settle one batch; returns the number of jobs claimed"""
+    jobs = await claim_jobs(db, worker_id, batch_size)
+    if not jobs:
+        return 0
+
+    with tracer.start_as_current_span('scrape_worker.batch', attributes={'scrape_jobs.claimed': len(jobs)}):
+        return await settle_jobs(db, worker_id, jobs)
+
+
+async def settle_jobs(db, worker_id, jobs):
+    """Scrape claimed jobs, write their prices and ack or fail each one"""
+    jobs_by_catalog = {job['catalogId']: job for job in jobs}
+    products = await db.catalogproduct.find_many(where={"id": {"in": list(jobs_by_catalog)}})
+    errors = {}
+    results = []
+
+    writer = PriceWriter(db)
+    try:
+        async with writer:
+            async def process_product(product, scraped_data):
+                if scraped_data and scraped_data.get('price'):
+                    await writer.add(product.id, scraped_data['price'])
+                else:
+                    errors[product.id] = "No price scraped"
+
+            results = await CheckEngine().run(products, process_product)
+    except Exception as e:
+        # The final flush failed; whatever earlier batches committed is still safe to ack
+        print(f"Worker {worker_id}: price write failed: {e}")
+        write_error = e
+    else:
+        write_error = "Price was not written"
+
+    for product, result in zip(products, results):
+        if isinstance(result, Exception):
+            errors.setdefault(product.id, result)
+
+    # Ack only jobs whose price is in a committed transaction (at worst one is scraped twice)
+    succeeded = [job['id'] for catalog_id, job in jobs_by_catalog.items() if catalog_id in writer.committed]
+    failed = [
+        (job, errors.get(catalog_id, write_error))
+        for catalog_id, job in jobs_by_catalog.items() if catalog_id not in writer.committed
+    ]
+
+    await ack_jobs(db, worker_id, succeeded)
+    for job, error in failed:
+        await fail_job(db, worker_id, job, error)
+
+    print(f"Worker {worker_id}: {len(succeeded)} scraped, {len(failed)} failed")
+    return len(jobs)
+
+
+async def main(args):
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    configure_tracing("pricepulse-scrape-worker")
+    db = await database.ensure_connected()
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    print(f"Scrape worker {worker_id} started")
+
+    try:
+        while True:
+            try:
+                claimed = await process_batch(db, worker_id, args.batch)
+            except Exception as e:
+                print(f"Scrape worker error: {e}")
+                claimed = 0
+
+            if not claimed:
+                if args.once:
+                    break
+                await asyncio.sleep(IDLE_SECONDS)
+    finally:
+        scraper.shutdown()
+        await database.disconnect()
+        shutdown_tracing()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Claim and process scrape jobs from the queue")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="jobs claimed per batch")
+    parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="serve Prometheus metrics on this port")
+    asyncio.run(main(parser.parse_args()))
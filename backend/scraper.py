@@ -1,56 +1,206 @@
-import subprocess
+import contextvars
 import json
-import tempfile
 import os
-from scrapy.crawler import CrawlerProcess
-from scrapy.utils.project import get_project_settings
-from scrapy_spider.amazon_spider import AmazonSpider
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
-class ScrapyRunner:
+from opentelemetry import trace
+
+from scrape_cache import scrape_cache
+from metrics import host_label, scrape_outcome, scrape_seconds, scraper_busy, scraper_queued
+from tracing import inject_context, tracer
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class CrawlWorkerProcess:
+    """Handle on one long-lived `scrapy_spider.worker` subprocess"""
+
     def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=4)
-    
-    def run_spider(self, url):
-        """Run spider in a separate process to avoid reactor issues"""
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'scrapy_spider.worker'],
+            cwd=BACKEND_DIR,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+        self.messages = queue.Queue()
+        threading.Thread(target=self._read_messages, daemon=True).start()
+
+    def _read_messages(self):
+        for line in self.process.stdout:
+            try:
+                self.messages.put(json.loads(line))
+            except ValueError:
+                continue
+        # EOF - the worker exited
+        self.messages.put(None)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def crawl(self, urls, timeout, on_item=None, validators=None):
+        """Send a batch to the worker and collect {url: item} as results stream in"""
+        job_id = uuid.uuid4().hex
+        # The worker continues the caller's trace from this carrier
+        request = {'id': job_id, 'urls': urls, 'validators': validators or {}, 'trace': inject_context()}
+        self.process.stdin.write(json.dumps(request) + '\n')
+        self.process.stdin.flush()
+
+        results = {}
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Crawl of {len(urls)} URLs timed out")
+            try:
+                message = self.messages.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError(f"Crawl of {len(urls)} URLs timed out")
+
+            if message is None:
+                raise RuntimeError("Crawler worker exited unexpectedly")
+            if message.get('ready'):
+                # A freshly spawned worker has finished importing Scrapy
+                trace.get_current_span().add_event('crawler.ready')
+                continue
+            if message.get('id') != job_id:
+                # Leftovers from an abandoned batch
+                continue
+            if message.get('done'):
+                return results
+
+            results[message['url']] = message['item']
+            if on_item:
+                on_item(message['url'], message['item'])
+
+    def close(self):
         try:
-            # Create temporary file for output
-            with tempfile.NamedTemporaryFile(mode='w+', suffix='.json', delete=False) as f:
-                output_file = f.name
-            
-            # Run scrapy as subprocess
-            cmd = [
-                'scrapy', 'crawl', 'amazon',
-                '-a', f'url={url}',
-                '-o', output_file,
-                '-s', 'LOG_LEVEL=ERROR'
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                cwd=os.path.dirname(__file__),
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            # Read results
-            if os.path.exists(output_file):
-                with open(output_file, 'r') as f:
-                    data = json.load(f)
-                os.unlink(output_file)
-                return data[0] if data else None
-            
-            return None
-            
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+
+
+class ScrapyRunner:
+    def __init__(self, pool_size=None, timeout=None):
+        self.pool_size = pool_size or int(os.getenv('SCRAPER_POOL_SIZE', 4))
+        self.timeout = timeout or float(os.getenv('SCRAPER_TIMEOUT', 30))
+        self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
+
+        # Worker slots are spawned lazily and handed out one batch at a time
+        self.idle = queue.Queue()
+        for _ in range(self.pool_size):
+            self.idle.put(None)
+
+    def _checkout(self):
+        worker = self.idle.get()
+        if worker is None or not worker.is_alive():
+            with tracer.start_as_current_span('scraper.spawn_worker'):
+                worker = CrawlWorkerProcess()
+        return worker
+
+    def run_batch(self, urls, on_item=None):
+        """Scrape a batch of URLs on one pooled worker, returns {url: item or None}"""
+        if not urls:
+            return {}
+
+        with tracer.start_as_current_span('scraper.batch', attributes={'scraper.urls': len(urls)}) as span:
+            results = self._run_batch(urls, on_item)
+            span.set_attribute('scraper.scraped', sum(1 for item in results.values() if item))
+            return results
+
+    def _run_batch(self, urls, on_item):
+        # Very recent results are served from the cache without a request
+        results = {}
+        for url in urls:
+            item = scrape_cache.fresh(url)
+            if item is not None:
+                results[url] = item
+                scrape_seconds.labels(host_label(url), 'cached').observe(0)
+                if on_item:
+                    on_item(url, item)
+
+        pending = [url for url in urls if url not in results]
+        trace.get_current_span().set_attribute('scraper.cache_hits', len(results))
+        if not pending:
+            return results
+
+        # Everything else is fetched conditionally against what we saw last time
+        validators = {url: scrape_cache.validators(url) for url in pending}
+        validators = {url: value for url, value in validators.items() if value}
+
+        started = time.perf_counter()
+
+        def handle_item(url, item):
+            scrape_seconds.labels(host_label(url), scrape_outcome(item)).observe(time.perf_counter() - started)
+            results[url] = scrape_cache.resolve(url, item)
+            if on_item:
+                on_item(url, results[url])
+
+        worker = self._checkout()
+        scraper_busy.inc()
+        try:
+            with tracer.start_as_current_span('scraper.crawl', attributes={'scraper.urls': len(pending)}):
+                worker.crawl(pending, self.timeout * len(pending), on_item=handle_item, validators=validators)
         except Exception as e:
             print(f"Scraping error: {e}")
-            return None
-    
+            for url in pending:
+                if url not in results:
+                    scrape_seconds.labels(host_label(url), 'error').observe(time.perf_counter() - started)
+            # A stuck or dead worker is replaced on next checkout
+            worker.close()
+            worker = None
+        finally:
+            scraper_busy.dec()
+            self.idle.put(worker)
+
+        return {url: results.get(url) for url in urls}
+
+    def run_spider(self, url):
+        """Scrape a single URL using a pooled crawler worker"""
+        return self.run_batch([url]).get(url)
+
+    async def _submit(self, function, *args):
+        """Run `function` on the executor, counting calls still waiting for a thread"""
+        scraper_queued.inc()
+        queued_at = time.perf_counter()
+
+        def run():
+            scraper_queued.dec()
+            trace.get_current_span().add_event('scraper.dequeued', {'scraper.queue_ms': (time.perf_counter() - queued_at) * 1000})
+            return function(*args)
+
+        # Carry the caller's trace context into the executor thread
+        future = self.executor.submit(contextvars.copy_context().run, run)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A call cancelled before it got a thread never leaves the queue on its own
+            if future.cancel():
+                scraper_queued.dec()
+            raise
+
     async def scrape_amazon(self, url):
         """Async wrapper for scraping"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, self.run_spider, url)
+        return await self._submit(self.run_spider, url)
+
+    def shutdown(self):
+        """Stop all crawler worker processes"""
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker:
+                worker.close()
+        self.executor.shutdown(wait=False)
 
-scraper = ScrapyRunner()
\ No newline at end of file
+scraper = ScrapyRunner()
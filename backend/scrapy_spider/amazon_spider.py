@@ -1,14 +1,47 @@
 import scrapy
+import hashlib
 import json
+import time
 from urllib.parse import urljoin
 
+from opentelemetry import trace
+
+from scrapy_spider.extractor import extract_async
+from tracing import extract_context, tracer
+
+# Raw markup that starts the price block; the bytes after it are hashed to detect changes
+PRICE_REGION_MARKERS = (b'id="corePrice', b'id="priceblock_', b'class="a-price')
+PRICE_REGION_BYTES = 4096
+
+def price_region_hash(body):
+    """Hash of the page's price block without parsing it, or None if no block is found"""
+    for marker in PRICE_REGION_MARKERS:
+        start = body.find(marker)
+        if start != -1:
+            return hashlib.blake2b(body[start:start + PRICE_REGION_BYTES], digest_size=16).hexdigest()
+    return None
+
 class AmazonSpider(scrapy.Spider):
     name = 'amazon'
     
-    def __init__(self, url=None, *args, **kwargs):
+    def __init__(self, url=None, urls=None, validators=None, trace_carrier=None, *args, **kwargs):
         super(AmazonSpider, self).__init__(*args, **kwargs)
-        self.start_urls = [url] if url else []
+        # Pool workers hand over a whole batch; `scrapy crawl -a url=...` still works
+        if isinstance(urls, str):
+            urls = [u for u in urls.split(',') if u]
+        self.start_urls = list(urls or []) or ([url] if url else [])
+        # Per-URL ETag / Last-Modified / price region hash from the last scrape
+        self.validators = validators or {}
+        # Download and parse spans join the trace of the batch that asked for them;
+        # nothing is recorded (or allocated) for untraced or unsampled batches
+        self.trace_context = extract_context(trace_carrier)
+        self.traced = trace.get_current_span(self.trace_context).get_span_context().trace_flags.sampled
         
+    async def start(self):
+        # Scrapy 2.13+ no longer calls start_requests() from the default start()
+        for request in self.start_requests():
+            yield request
+    
     def start_requests(self):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -20,52 +53,60 @@ class AmazonSpider(scrapy.Spider):
         }
         
         for url in self.start_urls:
-            yield scrapy.Request(url=url, headers=headers, callback=self.parse)
+            known = self.validators.get(url) or {}
+            request_headers = dict(headers)
+            if known.get('etag'):
+                request_headers['If-None-Match'] = known['etag']
+            if known.get('last_modified'):
+                request_headers['If-Modified-Since'] = known['last_modified']
+            
+            yield scrapy.Request(
+                url=url,
+                headers=request_headers,
+                callback=self.parse,
+                meta={'source_url': url, 'known': known, 'handle_httpstatus_list': [304]}
+            )
     
-    def parse(self, response):
-        # Extract product name
-        name = response.css('#productTitle::text').get()
-        if name:
-            name = name.strip()
-        
-        # Extract price
-        price_selectors = [
-            'span.a-price.a-text-price.a-size-medium.apexPriceToPay span.a-offscreen::text',
-            'span.a-price-whole::text',
-            '.a-price .a-offscreen::text',
-            '.a-price-current .a-offscreen::text',
-            '#priceblock_dealprice::text',
-            '#priceblock_ourprice::text'
-        ]
-        
-        price = None
-        for selector in price_selectors:
-            price_text = response.css(selector).get()
-            if price_text:
-                # Clean price text
-                price_text = price_text.replace('₹', '').replace(',', '').replace('$', '').strip()
-                try:
-                    price = float(price_text)
-                    break
-                except ValueError:
-                    continue
+    def record_span(self, name, start, end, attributes):
+        """Record an already timed stage as a child of the batch span"""
+        tracer.start_span(name, context=self.trace_context, start_time=start, attributes=attributes).end(end_time=end)
+    
+    async def parse(self, response):
+        if self.traced and response.meta.get('download_latency') is not None:
+            # Scrapy has already timed the download
+            end = time.time_ns()
+            self.record_span('crawler.download', end - int(response.meta['download_latency'] * 1e9), end, {
+                'url.full': response.url,
+                'http.response.status_code': response.status,
+                'http.response.body.size': len(response.body)
+            })
+        known = response.meta.get('known') or {}
+        etag = response.headers.get('ETag', b'').decode('latin-1') or None
+        last_modified = response.headers.get('Last-Modified', b'').decode('latin-1') or None
         
-        # Extract image
-        image_selectors = [
-            '#imgTagWrapperId img::attr(src)',
-            '#landingImage::attr(src)',
-            '.a-dynamic-image::attr(src)'
-        ]
+        # Unchanged page: skip parsing and let the caller reuse its cached item
+        region_hash = None if response.status == 304 else price_region_hash(response.body)
+        if response.status == 304 or (region_hash and region_hash == known.get('region_hash')):
+            yield {
+                'url': response.url,
+                '_not_modified': True,
+                '_etag': etag,
+                '_last_modified': last_modified
+            }
+            return
         
-        image = None
-        for selector in image_selectors:
-            image = response.css(selector).get()
-            if image:
-                break
+        # One pass over the document; may run in the parse process pool
+        started = time.time_ns()
+        data = await extract_async(response.body, response.encoding)
+        if self.traced:
+            self.record_span('crawler.parse', started, time.time_ns(), {'url.full': response.url})
         
         yield {
-            'name': name,
-            'price': price,
-            'image': image,
-            'url': response.url
+            'name': data['name'],
+            'price': data['price'],
+            'image': data['image'],
+            'url': response.url,
+            '_etag': etag,
+            '_last_modified': last_modified,
+            '_region_hash': region_hash
         }
\ No newline at end of file
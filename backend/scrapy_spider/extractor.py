@@ -0,0 +1,185 @@
+"""
+Single-pass product extraction for Amazon pages.
+
+All name, price and image candidates are collected in a single walk of the
+lxml tree, matched by id and one precompiled class regex. Each candidate is
+then ranked against the same priority order the old CSS selector cascade
+used, so results match it while the document is only walked once (the old
+cascade walked it once per selector). A compiled XPath union was measured
+too, but libxml2 evaluates each branch as its own walk and came out slower.
+
+extract() takes raw bytes and returns a plain dict, so it can run in a
+process pool (see SCRAPER_PARSE_PROCESSES) separately from the crawler's I/O.
+"""
+import asyncio
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+
+CANDIDATE_IDS = frozenset(('productTitle', 'priceblock_dealprice', 'priceblock_ourprice', 'imgTagWrapperId', 'landingImage'))
+CANDIDATE_CLASS = re.compile(r'(?:^|\s)(?:a-offscreen|a-price-whole|a-dynamic-image)(?:\s|$)')
+
+# One parser per page encoding; comments are dropped while parsing
+PARSERS = {}
+
+# A run of digits joined by separators, so any grouping works: "1,299", "1.299,99", "12 999" and
+# Indian lakh grouping like "1,29,999.00". Whitespace only joins groups of exactly three digits.
+PRICE_PATTERN = re.compile(r'\d+(?:[.,]\d+|[\s\u00a0\u202f]\d{3}(?!\d))*')
+# Only the last separator, and only when 1-2 digits follow it, is a decimal point
+DECIMAL_PART = re.compile(r'[.,](\d{1,2})$')
+NON_DIGITS = re.compile(r'\D')
+
+APEX_PRICE_CLASSES = {'a-price', 'a-text-price', 'a-size-medium', 'apexPriceToPay'}
+
+# Parse in a process pool when > 0, so one crawler worker parses and downloads in parallel
+PARSE_PROCESSES = int(os.getenv('SCRAPER_PARSE_PROCESSES', 0))
+parse_pool = None
+
+
+def parse_price(text):
+    """Locale-agnostic price parsing, None if the text holds no number"""
+    if not text:
+        return None
+    match = PRICE_PATTERN.search(text)
+    if not match:
+        return None
+    number = match.group()
+    decimal = DECIMAL_PART.search(number)
+    if decimal:
+        number, fraction = number[:decimal.start()], decimal.group(1)
+    else:
+        fraction = '0'
+    return float(f"{NON_DIGITS.sub('', number)}.{fraction}")
+
+
+def classes(element):
+    return set((element.get('class') or '').split())
+
+
+def price_rank(element):
+    """Priority of a price candidate, matching the old selector order (lower wins)"""
+    element_id = element.get('id')
+    if element_id == 'priceblock_dealprice':
+        return 4
+    if element_id == 'priceblock_ourprice':
+        return 5
+
+    own = classes(element)
+    if 'a-price-whole' in own:
+        return 1
+    if 'a-offscreen' in own:
+        ancestors = list(element.iterancestors())
+        if any(ancestor.get('data-a-strike') == 'true' for ancestor in ancestors):
+            # Struck-through list price or M.R.P., never the price to pay
+            return None
+        above = [classes(ancestor) for ancestor in ancestors]
+        if any(ancestor.tag == 'span' and APEX_PRICE_CLASSES <= found
+               for ancestor, found in zip(ancestors, above)):
+            return 0
+        if any('a-price' in found for found in above):
+            return 2
+        if any('a-price-current' in found for found in above):
+            return 3
+    return None
+
+
+def price_text(element):
+    """Text of a price candidate; a split "a-price-whole" span gets its "a-price-fraction" sibling back"""
+    text = element.text
+    if text and 'a-price-whole' in classes(element):
+        fraction = element.getnext()
+        if fraction is not None and 'a-price-fraction' in classes(fraction) and fraction.text:
+            return f"{text.strip().rstrip('.,')}.{fraction.text.strip()}"
+    return text
+
+
+def image_rank(element):
+    if element.get('id') == 'landingImage':
+        return 1
+    if 'a-dynamic-image' in classes(element):
+        return 2
+    return None
+
+
+def candidates(root):
+    """Every element that any of the old selectors could match, in document order"""
+    for element in root.iter(etree.Element):
+        if element.get('id') in CANDIDATE_IDS:
+            yield element
+            continue
+        element_class = element.get('class')
+        if element_class and 'a-' in element_class and CANDIDATE_CLASS.search(element_class):
+            yield element
+
+
+def parse_document(body, encoding):
+    parser = PARSERS.get(encoding)
+    if parser is None:
+        parser = PARSERS[encoding] = etree.HTMLParser(encoding=encoding, remove_comments=True, collect_ids=False)
+    return etree.fromstring(body, parser)
+
+
+def extract(body, encoding='utf-8'):
+    """Extract {"name", "price", "image"} from a product page in one pass"""
+    try:
+        root = parse_document(body, encoding)
+    except (etree.ParserError, ValueError, LookupError):
+        root = None
+    if root is None:
+        return {'name': None, 'price': None, 'image': None}
+
+    name = None
+    prices = []
+    images = []
+    for element in candidates(root):
+        element_id = element.get('id')
+        if element_id == 'productTitle':
+            if name is None:
+                name = (element.text or '').strip() or None
+            continue
+
+        if element_id == 'imgTagWrapperId':
+            image = next((img.get('src') for img in element.iter('img') if img.get('src')), None)
+            if image:
+                images.append((0, image))
+            continue
+
+        rank = price_rank(element)
+        if rank is not None:
+            prices.append((rank, price_text(element)))
+            continue
+
+        rank = image_rank(element)
+        if rank is not None and element.get('src'):
+            images.append((rank, element.get('src')))
+
+    # Like the cascade: first selector that yields a parseable number wins,
+    # in document order within a selector
+    price = None
+    for rank, text in sorted(prices, key=lambda candidate: candidate[0]):
+        price = parse_price(text)
+        if price is not None:
+            break
+
+    image = min(images, key=lambda candidate: candidate[0])[1] if images else None
+    return {'name': name, 'price': price, 'image': image}
+
+
+async def extract_async(body, encoding='utf-8'):
+    """extract() off the reactor thread when SCRAPER_PARSE_PROCESSES is set, inline otherwise"""
+    global parse_pool
+    if not PARSE_PROCESSES:
+        return extract(body, encoding)
+    if parse_pool is None:
+        # Forking the threaded crawler worker can deadlock the children, so spawn them
+        parse_pool = ProcessPoolExecutor(max_workers=PARSE_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+    return await asyncio.get_running_loop().run_in_executor(parse_pool, extract, body, encoding)
+
+
+def shutdown_parse_pool():
+    if parse_pool is not None:
+        parse_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,122 @@
+"""
+Long-lived crawler worker used by the ScrapyRunner process pool.
+
+The worker starts the Twisted reactor once and keeps AmazonSpider loaded.
+It reads one JSON request per line on stdin:
+
+    {"id": "<job id>", "urls": ["https://www.amazon.in/dp/...", ...],
+     "validators": {"<url>": {"etag": ..., "last_modified": ..., "region_hash": ...}},
+     "trace": {"traceparent": "00-..."}}
+
+and streams one JSON line per URL back on stdout as soon as it is scraped,
+followed by a completion marker for the batch:
+
+    {"id": "<job id>", "url": "...", "item": {...} | null}
+    {"id": "<job id>", "done": true}
+
+Run with `python -m scrapy_spider.worker` from the backend directory.
+"""
+import json
+import os
+import sys
+import threading
+
+from scrapy import signals
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.log import configure_logging
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.reactor import install_reactor
+from opentelemetry import trace
+from twisted.python.failure import Failure
+
+from scrapy_spider.amazon_spider import AmazonSpider
+from scrapy_spider.extractor import shutdown_parse_pool
+from tracing import configure_tracing, extract_context, inject_context, shutdown_tracing, tracer
+
+
+class CrawlWorker:
+    def __init__(self, out, settings):
+        configure_logging(settings)
+
+        self.runner = CrawlerRunner(settings)
+        self.out = out
+
+    def emit(self, message):
+        """Write one protocol line - only ever called from the reactor thread"""
+        self.out.write(json.dumps(message) + '\n')
+        self.out.flush()
+
+    def run_batch(self, job_id, urls, validators=None, trace_carrier=None):
+        """Crawl a batch of URLs, streaming items back as they are scraped"""
+        crawler = self.runner.create_crawler(AmazonSpider)
+        pending = set(urls)
+        # Ended explicitly: Twisted callbacks don't carry a current span
+        span = tracer.start_span('crawler.batch', context=extract_context(trace_carrier), attributes={'scraper.urls': len(urls)})
+
+        def on_item(item, response, spider):
+            url = response.meta.get('source_url', response.url)
+            pending.discard(url)
+            self.emit({'id': job_id, 'url': url, 'item': dict(item)})
+
+        def on_finished(result):
+            if isinstance(result, Failure):
+                print(f"Crawl batch {job_id} failed: {result.getErrorMessage()}")
+                span.set_status(trace.StatusCode.ERROR, result.getErrorMessage())
+            # URLs that errored or yielded nothing still get an answer
+            for url in pending:
+                self.emit({'id': job_id, 'url': url, 'item': None})
+            self.emit({'id': job_id, 'done': True})
+            span.set_attribute('scraper.missing', len(pending))
+            span.end()
+
+        crawler.signals.connect(on_item, signal=signals.item_scraped, weak=False)
+        deferred = self.runner.crawl(
+            crawler, urls=urls, validators=validators or {},
+            trace_carrier=inject_context(trace.set_span_in_context(span))
+        )
+        deferred.addBoth(on_finished)
+
+
+def main():
+    # Keep the protocol pipe private so stray prints or logs can't corrupt it
+    out = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    settings = get_project_settings()
+    settings.set('LOG_LEVEL', os.getenv('SCRAPER_LOG_LEVEL', 'ERROR'))
+    configure_tracing('pricepulse-crawler')
+
+    # The reactor must match the project settings before anything imports it
+    if settings.get('TWISTED_REACTOR'):
+        install_reactor(settings['TWISTED_REACTOR'])
+    from twisted.internet import reactor
+
+    worker = CrawlWorker(out, settings)
+
+    def read_requests():
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                print(f"Worker ignoring malformed request: {line[:200]}")
+                continue
+            reactor.callFromThread(
+                worker.run_batch, request['id'], request['urls'], request.get('validators'), request.get('trace')
+            )
+
+        # Parent closed stdin - shut down cleanly
+        reactor.callFromThread(reactor.stop)
+
+    threading.Thread(target=read_requests, daemon=True).start()
+    worker.emit({'ready': True})
+    reactor.run(installSignalHandlers=False)
+    shutdown_parse_pool()
+    shutdown_tracing()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Price parsing across marketplace number formats, including Indian lakh grouping"""
+import pytest
+
+from scrapy_spider.extractor import extract, parse_price
+
+
+@pytest.mark.parametrize("text, price", [
+    ("₹1,299.00", 1299.0),
+    ("$1,299", 1299.0),
+    ("1.299,99 €", 1299.99),
+    ("12,99", 12.99),
+    ("1,299.", 1299.0),
+    ("£8.5", 8.5),
+    ("₹1,29,999.00", 129999.0),
+    ("1,29,999.00", 129999.0),
+    ("₹1,00,000", 100000.0),
+    ("12,34,567", 1234567.0),
+    ("₹12,34,567.50", 1234567.5),
+    ("1 299,00 €", 1299.0),
+    ("1\u00a0299,00 €", 1299.0),
+    ("1\u202f299,00 €", 1299.0),
+    ("₹999 - ₹1,499", 999.0),
+])
+def test_parse_price(text, price):
+    assert parse_price(text) == price
+
+
+@pytest.mark.parametrize("text", [None, "", "Currently unavailable."])
+def test_parse_price_without_a_number(text):
+    assert parse_price(text) is None
+
+
+def page(price_html):
+    return f"""<html><body>
+        <span id="productTitle"> Test Phone </span>
+        {price_html}
+    </body></html>""".encode()
+
+
+def test_split_whole_and_fraction_spans_with_lakh_grouping():
+    body = page(
+        '<span class="a-price"><span class="a-price-symbol">₹</span>'
+        '<span class="a-price-whole">1,29,999<span class="a-price-decimal">.</span></span>'
+        '<span class="a-price-fraction">50</span></span>'
+    )
+    assert extract(body)["price"] == 129999.5
+
+
+def test_apex_offscreen_price_with_lakh_grouping():
+    body = page(
+        '<span class="a-price aok-align-center apexPriceToPay a-text-price a-size-medium">'
+        '<span class="a-offscreen">₹12,34,567.00</span></span>'
+    )
+    assert extract(body)["price"] == 1234567.0
+
+
+def test_struck_through_list_price_is_skipped():
+    list_price = (
+        '<span class="a-price a-text-price a-size-base" data-a-strike="true">'
+        '<span class="a-offscreen">$1,199.99</span></span>'
+    )
+    assert extract(page(list_price))["price"] is None
+    assert extract(page(
+        list_price + '<span class="a-price a-size-medium"><span class="a-offscreen">$1,049.95</span></span>'
+    ))["price"] == 1049.95
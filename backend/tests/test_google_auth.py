@@ -0,0 +1,111 @@
+"""ID token verification against a local JWKS file standing in for Google's certs endpoint"""
+import asyncio
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import google_auth
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+def new_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def write_jwks(path, keys):
+    """keys: {kid: private key}; writes their public halves as a JWKS document"""
+    jwks = {"keys": []}
+    for kid, key in keys.items():
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key()))
+        jwk.update({"kid": kid, "use": "sig", "alg": "RS256"})
+        jwks["keys"].append(jwk)
+    path.write_text(json.dumps(jwks))
+
+
+def id_token(key, kid, **claims):
+    now = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "user@example.com",
+        "iat": now,
+        "exp": now + 3600,
+        **claims,
+    }
+    return jwt.encode(payload, key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def signing_key(tmp_path, monkeypatch):
+    key = new_key()
+    jwks_path = tmp_path / "certs.json"
+    write_jwks(jwks_path, {"key-1": key})
+
+    cache = google_auth.JWKSCache(path=str(jwks_path))
+    fetches = []
+    fetch = cache.fetch
+
+    async def counting_fetch():
+        fetches.append(time.monotonic())
+        return await fetch()
+
+    cache.fetch = counting_fetch
+    monkeypatch.setattr(google_auth, "jwks_cache", cache)
+    monkeypatch.setattr(google_auth, "GOOGLE_CLIENT_ID", CLIENT_ID)
+    return key, jwks_path, cache, fetches
+
+
+def decode(token):
+    return asyncio.run(google_auth.GoogleAuth.decode_id_token(token))
+
+
+def test_valid_token_is_accepted(signing_key):
+    key, _, _, _ = signing_key
+    assert decode(id_token(key, "key-1"))["email"] == "user@example.com"
+
+
+def test_bad_signature_is_rejected(signing_key):
+    # Right kid, wrong private key
+    with pytest.raises(Exception, match="Invalid ID token"):
+        decode(id_token(new_key(), "key-1"))
+
+
+def test_wrong_audience_is_rejected(signing_key):
+    key, _, _, _ = signing_key
+    with pytest.raises(Exception, match="Invalid ID token"):
+        decode(id_token(key, "key-1", aud="someone-else.apps.googleusercontent.com"))
+
+
+def test_wrong_issuer_is_rejected(signing_key):
+    key, _, _, _ = signing_key
+    with pytest.raises(Exception, match="Invalid ID token"):
+        decode(id_token(key, "key-1", iss="https://evil.example.com"))
+
+
+def test_unknown_kid_is_rejected_and_refresh_is_throttled(signing_key):
+    key, _, _, fetches = signing_key
+    decode(id_token(key, "key-1"))
+    assert len(fetches) == 1
+
+    # A burst of unknown kids right after a fetch must not hammer the JWKS endpoint
+    for _ in range(3):
+        with pytest.raises(Exception, match="Unknown signing key"):
+            decode(id_token(key, "key-2"))
+    assert len(fetches) == 1
+
+
+def test_rotated_key_is_picked_up_after_the_refresh_interval(signing_key):
+    key, jwks_path, cache, fetches = signing_key
+    decode(id_token(key, "key-1"))
+
+    rotated = new_key()
+    write_jwks(jwks_path, {"key-1": key, "key-2": rotated})
+    cache.fetched_at -= google_auth.JWKS_MIN_REFRESH_INTERVAL
+
+    assert decode(id_token(rotated, "key-2"))["sub"] == "1234567890"
+    assert len(fetches) == 2
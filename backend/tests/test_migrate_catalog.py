@@ -0,0 +1,110 @@
+"""Catalog migration of legacy products, including URLs with no ASIN"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import migrate_catalog
+from catalog import canonicalize_url
+
+SHORT_LINK = "https://amzn.in/d/abc123"
+
+
+class Table:
+    """Just enough of a Prisma model client for the migration, over a list of namespaces"""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    @staticmethod
+    def matches(row, where):
+        return all(getattr(row, key, None) == value for key, value in where.items())
+
+    async def find_many(self, where, order=None):
+        return [row for row in self.rows if self.matches(row, where)]
+
+    async def find_unique(self, where):
+        key = where["marketplace_asin"]
+        return next((row for row in self.rows if self.matches(row, key)), None)
+
+    async def create(self, data):
+        row = SimpleNamespace(id=f"c{len(self.rows) + 1}", **data)
+        self.rows.append(row)
+        return row
+
+    async def update(self, where, data):
+        for row in await self.find_many(where):
+            vars(row).update(data)
+
+    async def update_many(self, where, data):
+        await self.update(where, data)
+
+    async def delete_many(self, where):
+        self.rows = [row for row in self.rows if not self.matches(row, where)]
+
+    async def count(self):
+        return len(self.rows)
+
+
+def product(id, url):
+    return SimpleNamespace(
+        id=id, url=url, userId="u1", name="Phone", image=None, currentPrice=999.0, catalogId=None
+    )
+
+
+def fake_db(products):
+    db = SimpleNamespace(
+        product=Table(products), catalogproduct=Table(), pricehistory=Table(), alert=Table(),
+        connected=False
+    )
+
+    async def connect():
+        db.connected = True
+
+    async def disconnect():
+        db.connected = False
+
+    db.connect, db.disconnect = connect, disconnect
+    return db
+
+
+async def resolve_short_links(product):
+    """Stands in for the scrape: the short link redirects to a product page"""
+    if product.url == SHORT_LINK:
+        return canonicalize_url("https://www.amazon.in/dp/B0SHORT001?ref=share")
+    return canonicalize_url(product.url)
+
+
+def test_short_link_is_linked_through_its_resolved_url():
+    db = fake_db([
+        product("p1", "https://www.amazon.in/dp/B0SHORT001"),
+        product("p2", SHORT_LINK),
+    ])
+
+    unresolved = asyncio.run(migrate_catalog.link_products(db, resolve=resolve_short_links))
+
+    assert unresolved == []
+    assert len(db.catalogproduct.rows) == 1
+    assert {row.catalogId for row in db.product.rows} == {"c1"}
+
+
+def test_product_without_asin_is_reported_not_skipped():
+    no_asin = product("p2", "https://www.amazon.in/s?k=phone")
+    db = fake_db([product("p1", "https://www.amazon.in/dp/B0FIXTURE1"), no_asin])
+
+    unresolved = asyncio.run(migrate_catalog.link_products(db, resolve=resolve_short_links))
+
+    assert unresolved == [no_asin]
+    assert no_asin.catalogId is None
+    assert db.product.rows[0].catalogId == "c1"
+
+
+def test_migration_fails_while_products_are_unresolved(monkeypatch):
+    db = fake_db([product("p1", "https://www.amazon.in/s?k=phone")])
+    monkeypatch.setattr(migrate_catalog, "prisma", SimpleNamespace(Prisma=lambda: db))
+    monkeypatch.setattr(migrate_catalog, "resolve_key", resolve_short_links)
+    monkeypatch.setattr(migrate_catalog.scraper, "shutdown", lambda: None)
+
+    with pytest.raises(SystemExit, match="1 products could not be linked"):
+        asyncio.run(migrate_catalog.migrate())
+    assert not db.connected
@@ -0,0 +1,58 @@
+"""Per-host budgets: a throttled host must not hold global check slots while it waits"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from price_check import CheckEngine
+
+
+def product(n, host):
+    return SimpleNamespace(id=f"{host}-{n}", name=f"{host} {n}", url=f"https://www.{host}/dp/B0TEST{n:04d}")
+
+
+def test_throttled_host_does_not_starve_other_hosts():
+    concurrency = 2
+    running = {"amazon.com": 0}
+    peak = {"amazon.com": 0}
+    done = []
+
+    async def scrape(url):
+        host = "amazon.com" if "amazon.com" in url else "amazon.in"
+        if host in running:
+            running[host] += 1
+            peak[host] = max(peak[host], running[host])
+        await asyncio.sleep(0.05)
+        if host in running:
+            running[host] -= 1
+        return {"price": 1.0}
+
+    async def handler(product, scraped_data):
+        if "amazon.com" in product.url:
+            done.append(time.monotonic())
+
+    async def main():
+        engine = CheckEngine(
+            scrape=scrape, concurrency=concurrency, host_concurrency=concurrency,
+            host_rates={"amazon.in": 0.5, "amazon.com": 1000}, burst=1000, jitter=0
+        )
+        # amazon.in has used up its bucket: its next token is two seconds away
+        engine._bucket("amazon.in").tokens = 0
+
+        # The throttled host's products are queued first, as in a catalog sorted by due time
+        products = [product(n, "amazon.in") for n in range(4)] + [product(n, "amazon.com") for n in range(8)]
+        started = time.monotonic()
+        cycle = asyncio.create_task(engine.run(products, handler))
+        try:
+            while len(done) < 8 and time.monotonic() - started < 1.5:
+                await asyncio.sleep(0.01)
+        finally:
+            cycle.cancel()
+            await asyncio.gather(cycle, return_exceptions=True)
+        return started
+
+    started = asyncio.run(main())
+
+    # 8 scrapes of 50ms two at a time take ~0.2s; waiting behind amazon.in would take 2s+
+    assert len(done) == 8
+    assert max(done) - started < 1.0
+    assert peak["amazon.com"] == concurrency
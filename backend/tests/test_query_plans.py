@@ -0,0 +1,351 @@
+"""
+Query-plan regression tests for the hot query paths (opt-in).
+
+Seeds a disposable Postgres with large synthetic data, runs the real code
+paths (API handlers, the check cycle's write path, the job and email queue
+claims) through a Prisma client with query logging on, and EXPLAIN ANALYZEs
+every statement the engine actually sent. A test fails if any plan contains
+a sequential scan or a statement exceeds QUERY_PLAN_BUDGET_MS.
+
+Skipped unless QUERY_PLAN_DATABASE_URL points at a database whose schema is
+up to date:
+
+    DATABASE_URL=postgresql://localhost/pricepulse_plans python -m prisma db push
+    QUERY_PLAN_DATABASE_URL=postgresql://localhost/pricepulse_plans python -m pytest tests/test_query_plans.py
+
+Seeding truncates every table, so a non-local host is refused unless
+QUERY_PLAN_ALLOW_REMOTE=1. QUERY_PLAN_SCALE scales the seeded row counts.
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import pytest
+
+DATABASE_URL = os.getenv('QUERY_PLAN_DATABASE_URL')
+BUDGET_MS = float(os.getenv('QUERY_PLAN_BUDGET_MS', 25))
+SCALE = float(os.getenv('QUERY_PLAN_SCALE', 1.0))
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="set QUERY_PLAN_DATABASE_URL to run query plan checks")
+
+TABLES = (
+    'users', 'catalog_products', 'products', 'price_history', 'price_rollups',
+    'alerts', 'otp_verifications', 'outbound_emails', 'scrape_jobs'
+)
+STATEMENT = re.compile(r'^\s*(SELECT|WITH|UPDATE|DELETE|INSERT)\b', re.IGNORECASE)
+PLACEHOLDER = re.compile(r'\$(\d+)')
+
+
+async def seed(conn, users, products_per_user, catalog_size, history_per_product):
+    """Fill every table with synthetic rows shaped like production data"""
+    await conn.execute(f"TRUNCATE {', '.join(TABLES)} CASCADE")
+
+    await conn.execute(
+        '''
+        INSERT INTO users (id, email, verified, "createdAt", "updatedAt")
+        SELECT 'u' || g, 'user' || g || '@example.com', true, NOW(), NOW()
+        FROM generate_series(1, $1) AS g
+        ''',
+        users
+    )
+    await conn.execute(
+        '''
+        INSERT INTO catalog_products (id, marketplace, asin, url, name, "currentPrice", "nextCheckAt", "createdAt", "updatedAt")
+        SELECT 'c' || g, CASE WHEN g % 2 = 0 THEN 'amazon.in' ELSE 'amazon.com' END,
+               lpad(g::text, 10, '0'), 'https://www.amazon.in/dp/' || lpad(g::text, 10, '0'),
+               'Product ' || g, 100 + (g % 5000), NOW() + (g % 86400 || ' seconds')::interval, NOW(), NOW()
+        FROM generate_series(1, $1) AS g
+        ''',
+        catalog_size
+    )
+    await conn.execute(
+        '''
+        INSERT INTO products (id, url, name, "currentPrice", "userId", "catalogId", "createdAt", "updatedAt")
+        SELECT 'p' || g, 'https://www.amazon.in/dp/x', 'Product', 100,
+               'u' || (1 + g % $1), 'c' || (1 + (g::bigint * 7919) % $2),
+               NOW() - (g || ' seconds')::interval, NOW()
+        FROM generate_series(1, $1 * $3) AS g
+        ''',
+        users, catalog_size, products_per_user
+    )
+    # Every tenth row is a run-length row, so the lastSeenAt branch of history reads has data
+    await conn.execute(
+        '''
+        INSERT INTO price_history (id, price, timestamp, "lastSeenAt", "catalogId")
+        SELECT 'h' || c || '-' || h, 100 + ((c * h) % 50), NOW() - (h || ' hours')::interval,
+               CASE WHEN h % 10 = 0 THEN NOW() - ((h - 5) || ' hours')::interval END, 'c' || c
+        FROM generate_series(1, $1) AS c, generate_series(1, $2) AS h
+        ''',
+        catalog_size, history_per_product
+    )
+    await conn.execute(
+        '''
+        INSERT INTO price_rollups ("catalogId", resolution, "bucketStart", "openPrice", "closePrice", "minPrice", "maxPrice", samples)
+        SELECT "catalogId", 'day', date_trunc('day', timestamp), MIN(price), MAX(price), MIN(price), MAX(price), COUNT(*)
+        FROM price_history
+        GROUP BY "catalogId", date_trunc('day', timestamp)
+        '''
+    )
+    await conn.execute(
+        '''
+        INSERT INTO alerts (id, "targetPrice", email, "userId", "productId", "catalogId", "createdAt")
+        SELECT 'a' || id, "currentPrice" - 10, 'alert@example.com', "userId", id, "catalogId", "createdAt"
+        FROM products
+        '''
+    )
+    await conn.execute(
+        '''
+        INSERT INTO otp_verifications (id, email, otp, "expiresAt", verified, "createdAt")
+        SELECT 'o' || g, 'signup' || g || '@example.com', lpad((g % 1000000)::text, 6, '0'),
+               NOW() + INTERVAL '10 minutes', false, NOW()
+        FROM generate_series(1, $1) AS g
+        ''',
+        users
+    )
+    # Queues are mostly drained, as in steady state
+    await conn.execute(
+        '''
+        INSERT INTO outbound_emails (id, kind, recipient, payload, status, attempts, "nextAttemptAt", "createdAt")
+        SELECT 'e' || g, 'price_alert', 'user' || g || '@example.com', '{}'::jsonb,
+               CASE WHEN g % 100 = 0 THEN 'pending' WHEN g % 101 = 0 THEN 'held' ELSE 'sent' END,
+               1, NOW() - (g || ' seconds')::interval, NOW()
+        FROM generate_series(1, $1 * 10) AS g
+        ''',
+        users
+    )
+    await conn.execute(
+        '''
+        INSERT INTO scrape_jobs (id, "catalogId", status, attempts, "visibleAt", "createdAt", "updatedAt")
+        SELECT 'sj' || id, id, 'done', 1, NOW(), NOW(), NOW()
+        FROM catalog_products
+        '''
+    )
+    await conn.execute('ANALYZE')
+
+
+async def sample(conn):
+    """Pick representative parameter values from the seeded data"""
+    product = await conn.fetchrow('SELECT id, "userId", "catalogId" FROM products ORDER BY id LIMIT 1 OFFSET 100')
+    catalog_ids = await conn.fetch('SELECT id FROM catalog_products ORDER BY id LIMIT 50 OFFSET 200')
+    otp = await conn.fetchrow('SELECT email FROM otp_verifications LIMIT 1 OFFSET 100')
+    return SimpleNamespace(
+        user=SimpleNamespace(id=product['userId']),
+        product_id=product['id'],
+        catalog_id=product['catalogId'],
+        catalog_ids=[row['id'] for row in catalog_ids],
+        otp_email=otp['email'],
+    )
+
+
+@pytest.fixture(scope='module')
+def seeded():
+    asyncpg = pytest.importorskip('asyncpg')
+    from db_utils import asyncpg_dsn
+
+    host = urlsplit(DATABASE_URL).hostname
+    if host not in ('localhost', '127.0.0.1', '::1', None) and os.getenv('QUERY_PLAN_ALLOW_REMOTE') != '1':
+        pytest.fail(f"Refusing to truncate tables on {host}; set QUERY_PLAN_ALLOW_REMOTE=1 for a disposable remote database")
+
+    async def run():
+        conn = await asyncpg.connect(asyncpg_dsn(DATABASE_URL))
+        try:
+            await seed(
+                conn, users=int(5000 * SCALE), products_per_user=20,
+                catalog_size=int(20000 * SCALE), history_per_product=200
+            )
+            return await sample(conn)
+        finally:
+            await conn.close()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def prisma_client_class():
+    try:
+        from prisma import Prisma
+    except RuntimeError:
+        pytest.skip("Prisma client not generated (run prisma generate)")
+    return Prisma
+
+
+# Each scenario drives real application code; every statement it sends is checked
+async def products_pages(db, s, monkeypatch):
+    import main
+    page = await main.get_products(limit=50, cursor=None, fields=None, current_user=s.user)
+    await main.get_products(limit=50, cursor=page['next_cursor'], fields='slim', current_user=s.user)
+
+
+async def alerts_pages(db, s, monkeypatch):
+    import main
+    page = await main.get_alerts(limit=50, cursor=None, fields=None, current_user=s.user)
+    await main.get_alerts(limit=50, cursor=page['next_cursor'], fields='slim', current_user=s.user)
+
+
+async def product_history_window(db, s, monkeypatch):
+    import main
+    start = datetime.utcnow() - timedelta(days=3)
+    await main.get_product(s.product_id, start=start, end=None, max_points=None, current_user=s.user)
+
+
+async def product_rollups(db, s, monkeypatch):
+    import main
+    start = datetime.utcnow() - timedelta(days=90)
+    await main.get_product_rollups(s.product_id, resolution='day', start=start, end=None, current_user=s.user)
+
+
+async def verify_otp(db, s, monkeypatch):
+    import main
+    from fastapi import HTTPException
+    with pytest.raises(HTTPException):
+        await main.verify_otp(main.OTPVerify(email=s.otp_email, otp='000000', password='not-used'))
+
+
+async def claim_due(db, s, monkeypatch):
+    from check_policy import claim_due_products
+    await claim_due_products(db, 100)
+
+
+async def price_writer_batch(db, s, monkeypatch, history_mode='full'):
+    import history
+    import price_writer
+    monkeypatch.setattr(history, 'HISTORY_MODE', history_mode)
+    monkeypatch.setattr(price_writer, 'ADAPTIVE_SCHEDULE', True)
+    # Prices low enough that some alerts fire and their emails are queued
+    await price_writer.PriceWriter(db).write({catalog_id: 95.0 for catalog_id in s.catalog_ids})
+
+
+async def runlength_price_writer_batch(db, s, monkeypatch):
+    await price_writer_batch(db, s, monkeypatch, history_mode='runlength')
+
+
+async def scrape_job_queue(db, s, monkeypatch):
+    from scrape_queue import claim_jobs, enqueue_cycle
+    await enqueue_cycle(db, s.catalog_ids)
+    await claim_jobs(db, 'plan-check', 20)
+
+
+async def email_queue(db, s, monkeypatch):
+    from notifications import NotificationWorker, release_digests
+    worker = NotificationWorker()
+    worker.db = db
+    await worker.claim()
+    await release_digests(db)
+
+
+SCENARIOS = {
+    'products pages': products_pages,
+    'alerts pages': alerts_pages,
+    'product history window': product_history_window,
+    'product rollups': product_rollups,
+    'OTP verification': verify_otp,
+    'claim due catalog products': claim_due,
+    'price writer batch (full history)': price_writer_batch,
+    'price writer batch (runlength history)': runlength_price_writer_batch,
+    'scrape job queue': scrape_job_queue,
+    'email queue': email_queue,
+}
+
+
+def logged_statements(text):
+    """(sql, params) of every data statement in the engine's JSON query log"""
+    statements = []
+    for line in text.splitlines():
+        try:
+            fields = json.loads(line).get('fields', {})
+        except (ValueError, AttributeError):
+            continue
+        sql = fields.get('query')
+        if sql and STATEMENT.match(sql):
+            statements.append((sql, json.loads(fields.get('params') or '[]')))
+    return statements
+
+
+def literal(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if not isinstance(value, str):
+        value = json.dumps(value)
+    return "'" + value.replace("'", "''") + "'"
+
+
+def inline_params(sql, params):
+    """The logged statement with its parameters as literals, so EXPLAIN sees the values it ran with"""
+    return PLACEHOLDER.sub(lambda match: literal(params[int(match.group(1)) - 1]), sql)
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+async def capture(prisma_class, scenario, s, log_path, monkeypatch):
+    """Run a scenario on a query-logging client and return the statements it sent"""
+    import main
+    db = prisma_class(datasource={'url': DATABASE_URL}, log_queries=True)
+    with open(log_path, 'w') as log:
+        # The engine subprocess inherits sys.stdout at spawn and writes its query log there
+        stdout, sys.stdout = sys.stdout, log
+        try:
+            await db.connect()
+        finally:
+            sys.stdout = stdout
+
+    monkeypatch.setattr(main, 'db', db)
+    try:
+        await SCENARIOS[scenario](db, s, monkeypatch)
+    finally:
+        await db.disconnect()
+
+    with open(log_path) as log:
+        return logged_statements(log.read())
+
+
+async def explain(statements):
+    """Problems found in the plans of the captured statements, run in rolled-back transactions"""
+    import asyncpg
+    from db_utils import asyncpg_dsn
+
+    problems = []
+    conn = await asyncpg.connect(asyncpg_dsn(DATABASE_URL))
+    try:
+        for sql, params in statements:
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                result = await conn.fetchval(f'EXPLAIN (ANALYZE, FORMAT JSON) {inline_params(sql, params)}')
+            finally:
+                await transaction.rollback()
+
+            plan = json.loads(result)[0]
+            elapsed = plan['Planning Time'] + plan['Execution Time']
+            seq_scans = [
+                node.get('Relation Name') for node in plan_nodes(plan['Plan'])
+                if node['Node Type'] == 'Seq Scan'
+            ]
+            if seq_scans:
+                problems.append(f"sequential scan on {', '.join(seq_scans)}: {sql}")
+            if elapsed > BUDGET_MS:
+                problems.append(f"{elapsed:.2f}ms exceeds {BUDGET_MS}ms budget: {sql}")
+    finally:
+        await conn.close()
+    return problems
+
+
+@pytest.mark.parametrize('scenario', list(SCENARIOS))
+def test_hot_queries_use_indexes(scenario, seeded, prisma_client_class, tmp_path, monkeypatch):
+    statements = asyncio.run(capture(prisma_client_class, scenario, seeded, tmp_path / 'engine.log', monkeypatch))
+    assert statements, "no statements in the engine query log - is LOG_QUERIES output reaching the log file?"
+
+    problems = asyncio.run(explain(statements))
+    assert not problems, "\n".join(problems)
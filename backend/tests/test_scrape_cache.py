@@ -0,0 +1,50 @@
+"""Scrape cache revalidation: "not modified" answers are capped before a full parse is forced"""
+from scrape_cache import ScrapeCache
+
+URL = "https://www.amazon.in/dp/B0TEST0001"
+
+
+def fetched(price, etag='"v1"'):
+    return {"name": "Phone", "price": price, "image": None, "_etag": etag, "_region_hash": "abc"}
+
+
+def not_modified():
+    return {"_not_modified": True}
+
+
+def test_not_modified_reuses_cached_item():
+    cache = ScrapeCache(ttl=0, max_revalidations=3)
+    cache.resolve(URL, fetched(999.0))
+
+    assert cache.validators(URL) == {"etag": '"v1"', "last_modified": None, "region_hash": "abc"}
+    assert cache.resolve(URL, not_modified())["price"] == 999.0
+
+
+def test_validators_withheld_after_max_revalidations():
+    cache = ScrapeCache(ttl=0, max_revalidations=3)
+    cache.resolve(URL, fetched(999.0))
+
+    for _ in range(3):
+        assert cache.validators(URL) is not None
+        cache.resolve(URL, not_modified())
+
+    # The next check has to fetch and parse the page in full
+    assert cache.validators(URL) is None
+
+
+def test_full_fetch_resets_revalidation_count():
+    cache = ScrapeCache(ttl=0, max_revalidations=2)
+    cache.resolve(URL, fetched(999.0))
+    cache.resolve(URL, not_modified())
+    cache.resolve(URL, not_modified())
+    assert cache.validators(URL) is None
+
+    item = cache.resolve(URL, fetched(899.0, etag='"v2"'))
+
+    assert item["price"] == 899.0
+    assert cache.validators(URL)["etag"] == '"v2"'
+
+
+def test_not_modified_for_evicted_url_is_a_failed_scrape():
+    cache = ScrapeCache(ttl=0)
+    assert cache.resolve(URL, not_modified()) is None
@@ -0,0 +1,61 @@
+"""Application spans hang off FastAPI's built-in server span, with no tracing middleware of our own"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from tracing import tracer
+
+
+@pytest.fixture(scope="module")
+def exporter():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    # Like configure_tracing(): the global provider that `tracer` and FastAPI both use
+    trace.set_tracer_provider(provider)
+    if trace.get_tracer_provider() is not provider:
+        pytest.skip("another tracer provider is already installed in this process")
+    return exporter
+
+
+def test_track_spans_share_the_server_span_trace(exporter):
+    app = FastAPI()
+
+    @app.post("/api/products/track")
+    async def track():
+        with tracer.start_as_current_span("track.catalog_lookup"):
+            pass
+        with tracer.start_as_current_span("track.scrape"):
+            pass
+        return {"ok": True}
+
+    exporter.clear()
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/products/track",
+            headers={"traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"},
+        )
+    assert response.status_code == 200
+
+    spans = exporter.get_finished_spans()
+    servers = [span for span in spans if span.kind == trace.SpanKind.SERVER]
+    tracks = [span for span in spans if span.name.startswith("track.")]
+    assert len(servers) == 1, "FastAPI did not open a server span; it needs built-in telemetry (fastapi>=0.143)"
+    assert len(tracks) == 2
+
+    server = servers[0]
+    # The incoming traceparent is continued, and the app spans descend from the server span
+    # (FastAPI puts its own endpoint span in between)
+    assert server.context.trace_id == 0x0af7651916cd43dd8448eb211c80319c
+    by_id = {span.context.span_id: span for span in spans}
+    for span in tracks:
+        assert span.context.trace_id == server.context.trace_id
+        ancestors = []
+        while span.parent is not None and span.parent.span_id in by_id:
+            span = by_id[span.parent.span_id]
+            ancestors.append(span)
+        assert server in ancestors
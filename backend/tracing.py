@@ -0,0 +1,94 @@
+"""
+OpenTelemetry trace spans across track -> scrape -> persist -> alert.
+
+Code creates spans through the OpenTelemetry API from the module-level
+`tracer`. configure_tracing() installs an SDK provider only when
+TRACE_EXPORTER is set, so with tracing off every span is a no-op:
+
+- TRACE_EXPORTER: none (default), console (stdout), file (one JSON span per
+  line appended to TRACE_FILE) or otlp (needs opentelemetry-exporter-otlp;
+  the endpoint comes from the standard OTEL_EXPORTER_OTLP_* variables)
+- TRACE_SAMPLE_RATIO: share of new traces recorded (default 1.0). Child
+  spans follow their parent's decision, so a trace is kept or dropped whole,
+  including the part recorded in crawler worker processes.
+
+FastAPI opens the server span for each request (continuing an incoming
+traceparent) once a provider is installed; the spans here hang off it.
+ScrapyRunner hands the current context to its crawler worker as a W3C
+traceparent carrier in each batch request (see inject_context /
+extract_context), so download and parse spans join the caller's trace.
+"""
+import os
+import sys
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none').lower()
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_SAMPLE_RATIO = float(os.getenv('TRACE_SAMPLE_RATIO', 1.0))
+TRACING_ENABLED = TRACE_EXPORTER != 'none'
+
+# Proxies to the SDK provider once configure_tracing() has installed it
+tracer = trace.get_tracer('pricepulse')
+provider = None
+
+
+def make_exporter():
+    if TRACE_EXPORTER == 'console':
+        return ConsoleSpanExporter(out=sys.stdout)
+    if TRACE_EXPORTER == 'file':
+        # Line-buffered appends, so API and crawler processes can share one file
+        return ConsoleSpanExporter(
+            out=open(TRACE_FILE, 'a', buffering=1),
+            formatter=lambda span: span.to_json(indent=None) + '\n'
+        )
+    if TRACE_EXPORTER == 'otlp':
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("TRACE_EXPORTER=otlp needs opentelemetry-exporter-otlp, tracing disabled")
+            return None
+        return OTLPSpanExporter()
+    print(f"Unknown TRACE_EXPORTER {TRACE_EXPORTER!r}, tracing disabled")
+    return None
+
+
+def configure_tracing(service_name):
+    """Install the SDK provider for this process; a no-op when tracing is off"""
+    global provider
+    if provider is not None or not TRACING_ENABLED:
+        return
+
+    exporter = make_exporter()
+    if exporter is None:
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create({'service.name': service_name}),
+        sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO))
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    print(f"Tracing {service_name} to {TRACE_EXPORTER} (sample ratio {TRACE_SAMPLE_RATIO})")
+
+
+def shutdown_tracing():
+    """Flush spans still buffered in the batch processor"""
+    if provider is not None:
+        provider.shutdown()
+
+
+def inject_context(context=None):
+    """traceparent carrier for the current (or given) context, {} when nothing is traced"""
+    carrier = {}
+    propagate.inject(carrier, context=context)
+    return carrier
+
+
+def extract_context(carrier):
+    return propagate.extract(carrier or {})
+
@@ -0,0 +1,61 @@
+"""
+Bounded LRU + TTL cache of authenticated user records.
+
+get_current_user runs on every authenticated request. Caching the user row by
+id turns the common case into a JWT decode plus a dict lookup. Endpoints that
+change a user call invalidate() so the next request reloads it, and the TTL
+bounds staleness for changes made elsewhere (another instance, the DB directly).
+"""
+import os
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or int(os.getenv('USER_CACHE_SIZE', 10000))
+        self.ttl = ttl if ttl is not None else float(os.getenv('USER_CACHE_TTL_SECONDS', 60))
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Cached user or None; expired entries count as misses"""
+        entry = self.entries.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+        if entry:
+            del self.entries[user_id]
+        self.misses += 1
+        return None
+
+    def set(self, user_id, user):
+        if self.ttl <= 0:
+            return
+        self.entries[user_id] = (time.monotonic() + self.ttl, user)
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self.entries.pop(user_id, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+user_cache = UserCache()